@@ -14,8 +14,17 @@ import streamlit as st
 from openai import OpenAI
 from databricks.sdk import WorkspaceClient
 
+from src.backends import RoutingParser, RoutingPolicy, WarehouseBackend
 from src.config import DEFAULT_CONFIG
-from src.ingestion import ArxivIngestion, DocumentParser, KIEClient
+from src.ingestion import (
+    ArxivIngestion,
+    DocumentParser,
+    KIEClient,
+    PaperStatus,
+    arxiv_id_from_path,
+    split_arxiv_id,
+)
+from src.pipeline import PaperPipeline, Stage, StageStatus, estimate_parse
 
 # Get KA endpoint from config
 KA_ENDPOINT = DEFAULT_CONFIG.ka_endpoint
@@ -29,6 +38,8 @@ st.set_page_config(
 # Initialize session state
 if "search_results" not in st.session_state:
     st.session_state.search_results = []
+if "search_status" not in st.session_state:
+    st.session_state.search_status = {}  # arxiv_id -> PaperStatus
 if "papers_to_parse" not in st.session_state:
     st.session_state.papers_to_parse = set()
 if "parsed_papers" not in st.session_state:
@@ -53,8 +64,15 @@ def get_kie_client():
 
 @st.cache_resource
 def get_parser():
-    """Get cached document parser."""
-    return DocumentParser()
+    """Get cached document parser: local text extraction, warehouse when needed."""
+    ingestion = get_ingestion()
+    return RoutingParser(
+        warehouse=WarehouseBackend(DocumentParser(sql=ingestion.sql)),
+        # KIE reads only the text, and figure captions survive local extraction;
+        # tables do not, so those papers still go to ai_parse_document
+        policy=RoutingPolicy(fallback_on_figures=False),
+        pdf_cache=ingestion.pdf_cache,
+    )
 
 
 # =============================================================================
@@ -168,6 +186,12 @@ def search_tab():
             results = ingestion.search_papers(query, max_results=max_results)
             st.session_state.search_results = results
             st.session_state.papers_to_parse = set()
+            # One bulk lookup per search, not per paper or per rerun
+            try:
+                st.session_state.search_status = ingestion.check_existing(results)
+            except Exception as e:
+                st.session_state.search_status = {}
+                st.warning(f"Could not check for already-ingested papers: {e}")
 
     # Display results
     if st.session_state.search_results:
@@ -202,9 +226,17 @@ def search_tab():
                     st.session_state.papers_to_parse.discard(paper.arxiv_id)
 
             with col2:
-                # Check if already parsed
+                # Check if already parsed or ingested
                 already_parsed = paper.arxiv_id in st.session_state.parsed_papers
-                status = "✅ Parsed" if already_parsed else ""
+                ingest_status = st.session_state.search_status.get(paper.arxiv_id)
+                if already_parsed:
+                    status = "✅ Parsed"
+                elif ingest_status == PaperStatus.IN_KA:
+                    status = "📚 In KA"
+                elif ingest_status == PaperStatus.NEWER_VERSION:
+                    status = "🆕 Newer version"
+                else:
+                    status = ""
 
                 with st.expander(f"**{paper.title[:80]}{'...' if len(paper.title) > 80 else ''}** {status}"):
                     st.caption(f"arxiv:{paper.arxiv_id} | {paper.published[:10]} | {', '.join(paper.categories[:3])}")
@@ -221,11 +253,16 @@ def search_tab():
         if selected_count > 0:
             st.divider()
             st.success(f"{selected_count} paper(s) selected for parsing")
+            max_pages = st.number_input(
+                "Parse at most this many pages per paper (0 = all)",
+                min_value=0, max_value=500, value=0,
+                help="Long papers are parsed from a copy of their first pages",
+            )
             if st.button(f"📄 Parse {selected_count} Paper(s)", type="primary"):
-                parse_selected_papers()
+                parse_selected_papers(max_pages=max_pages or None)
 
 
-def parse_selected_papers():
+def parse_selected_papers(max_pages: int | None = None):
     """Download papers, parse with ai_parse_document, and extract fields using KIE agent."""
     selected_ids = st.session_state.papers_to_parse
     papers_to_process = [
@@ -236,81 +273,75 @@ def parse_selected_papers():
         st.warning("No papers selected")
         return
 
-    ingestion = get_ingestion()
-    parser = get_parser()
-    kie = get_kie_client()
+    # Skip download, parse and KIE for papers the KA already has
+    in_ka = [
+        p for p in papers_to_process
+        if st.session_state.search_status.get(p.arxiv_id) == PaperStatus.IN_KA
+    ]
+    if in_ka:
+        st.info(f"Skipping {len(in_ka)} paper(s) already in the Knowledge Assistant")
+        papers_to_process = [p for p in papers_to_process if p not in in_ka]
+        if not papers_to_process:
+            st.session_state.papers_to_parse = set()
+            return
+
+    pipeline = PaperPipeline(
+        get_ingestion(), get_parser(), get_kie_client(), max_pages=max_pages
+    )
     progress = st.progress(0, text="Starting...")
+    estimate_box = st.empty()
 
     success_count = 0
     total = len(papers_to_process)
+    active = {}  # arxiv_id -> stage it is currently in
+    downloaded = 0
+    to_parse = []  # StagedPdf of papers going on to parse
+
+    # Download, parse and KIE stages overlap: one paper is being extracted while
+    # the next is parsed and the one after that downloaded
+    for event in pipeline.run(papers_to_process):
+        if event.status == StageStatus.STARTED:
+            active[event.arxiv_id] = event.stage.value
+        else:
+            active.pop(event.arxiv_id, None)
+
+        # Page counts are probed at download, so the estimate firms up as they finish
+        if event.stage == Stage.DOWNLOAD and event.status != StageStatus.STARTED:
+            downloaded += 1
+            if event.result is None:
+                to_parse.append(event.staged)
+            if to_parse:
+                estimate = estimate_parse(to_parse, pipeline.workers[Stage.PARSE])
+                truncated = sum(1 for s in to_parse if s.truncated_to)
+                estimate_box.info(
+                    f"Parsing ~{estimate.pages} pages from {estimate.papers} paper(s)"
+                    + (f" ({truncated} capped at {max_pages} pages)" if truncated else "")
+                    + f", about {max(1, round(estimate.seconds / 60))} min"
+                    + ("" if downloaded == total else f" so far ({downloaded}/{total} downloaded)")
+                )
 
-    for i, paper in enumerate(papers_to_process):
-        # Step 1: Download PDF and upload to STAGING volume (not KA volume)
-        progress.progress(
-            (i + 0.25) / total,
-            text=f"[{i+1}/{total}] Downloading {paper.arxiv_id}...",
-        )
-
-        try:
-            staging_path, pdf_bytes = ingestion.download_to_staging(paper)
-        except Exception as e:
-            st.error(f"Failed to download {paper.arxiv_id}: {e}")
-            st.session_state.parsed_papers[paper.arxiv_id] = {
-                "paper": paper,
-                "pdf_bytes": None,
-                "extracted": None,
-                "status": "error",
-                "error": f"Download failed: {e}",
-            }
-            continue
-
-        # Step 2: Parse PDF from staging volume with ai_parse_document
-        progress.progress(
-            (i + 0.5) / total,
-            text=f"[{i+1}/{total}] Parsing PDF {paper.arxiv_id}... (1-2min)",
-        )
-
-        try:
-            parsed_doc = parser.parse_document(staging_path, paper.arxiv_id)
-        except Exception as e:
-            st.error(f"Failed to parse {paper.arxiv_id}: {e}")
-            st.session_state.parsed_papers[paper.arxiv_id] = {
-                "paper": paper,
-                "pdf_bytes": pdf_bytes,
-                "extracted": None,
-                "status": "error",
-                "error": f"Parse failed: {e}",
+        result = event.result
+        if result is not None:
+            st.session_state.parsed_papers[result.paper.arxiv_id] = {
+                "paper": result.paper,
+                "staging_path": result.staged.path if result.staged else None,
+                "extracted": result.extracted,
+                "status": "complete" if result.ok else "error",
+                "error": result.error,
             }
-            continue
+            if result.ok:
+                success_count += 1
+            else:
+                st.error(f"{result.paper.arxiv_id}: {result.error}")
 
-        # Step 3: Extract structured fields with KIE agent
+        in_flight = ", ".join(f"{arxiv_id} ({stage})" for arxiv_id, stage in active.items())
         progress.progress(
-            (i + 0.8) / total,
-            text=f"[{i+1}/{total}] Extracting fields from {paper.arxiv_id}... (30-60s)",
+            event.progress,
+            text=f"{success_count}/{total} done" + (f" · {in_flight}" if in_flight else ""),
         )
 
-        try:
-            extracted = kie.extract_from_text(parsed_doc.text_content, paper.arxiv_id)
-            st.session_state.parsed_papers[paper.arxiv_id] = {
-                "paper": paper,
-                "pdf_bytes": pdf_bytes,
-                "extracted": extracted,
-                "status": "complete",
-            }
-            success_count += 1
-        except Exception as e:
-            st.error(f"KIE extraction failed for {paper.arxiv_id}: {e}")
-            st.session_state.parsed_papers[paper.arxiv_id] = {
-                "paper": paper,
-                "pdf_bytes": pdf_bytes,
-                "extracted": None,
-                "status": "error",
-                "error": f"KIE failed: {e}",
-            }
-
-        progress.progress((i + 1) / total, text=f"Completed {i + 1}/{total}")
-
     progress.empty()
+    estimate_box.empty()
     st.success(f"Processed {success_count}/{total} papers. Go to Review tab to review.")
     st.session_state.papers_to_parse = set()
 
@@ -389,7 +420,7 @@ def review_tab():
                     with col_link1:
                         st.link_button("📄 PDF", paper.pdf_url)
                     with col_link2:
-                        clean_id = arxiv_id.replace("v1", "").replace("v2", "").replace("v3", "")
+                        clean_id = split_arxiv_id(arxiv_id)[0]
                         st.link_button("🔗 Arxiv", f"https://arxiv.org/abs/{clean_id}")
 
                     # KIE-extracted insights (collapsible)
@@ -438,9 +469,9 @@ def add_to_knowledge_assistant():
             continue
 
         paper = data["paper"]
-        pdf_bytes = data.get("pdf_bytes")
-        if not pdf_bytes:
-            st.error(f"No PDF data for {arxiv_id}")
+        staging_path = data.get("staging_path")
+        if not staging_path:
+            st.error(f"No staged PDF for {arxiv_id}")
             continue
 
         progress.progress(
@@ -449,7 +480,7 @@ def add_to_knowledge_assistant():
         )
 
         try:
-            ingestion.promote_to_ka(paper, pdf_bytes)
+            ingestion.promote_to_ka(paper, staging_path)
             success_count += 1
         except Exception as e:
             st.error(f"Failed to add {arxiv_id}: {e}")
@@ -480,14 +511,18 @@ def ka_manager_tab():
 
     ingestion = get_ingestion()
 
-    # Get papers from Delta table (persistent storage)
-    papers_from_db = ingestion.get_all_papers()
-    papers_lookup = {p["arxiv_id"]: p for p in papers_from_db}
+    # Get papers from the local mirror of the Delta table; it re-syncs with the
+    # warehouse at most every few seconds rather than on every rerun
+    ingestion.sync_mirror()
+    papers_lookup = {
+        p["arxiv_id"]: p
+        for p in ingestion.mirror.list_papers(columns=("arxiv_id", "title", "authors"))
+    }
 
-    # Get file list
+    # Get file list (cached between reruns; Refresh re-lists the volume)
     files = ingestion.list_uploaded_files()
 
-    if not files and not papers_from_db:
+    if not files and not papers_lookup:
         st.info("No documents in Knowledge Assistant yet.")
         st.write("Use the Search → Review workflow to add papers.")
         return
@@ -496,10 +531,12 @@ def ka_manager_tab():
     col1, col2, col3, col4 = st.columns([1, 1, 1, 2])
     with col1:
         if st.button("🔄 Refresh", key="ka_refresh"):
+            ingestion.sync_mirror(force=True)
+            ingestion.list_uploaded_files(refresh=True)
             st.rerun()
     with col2:
         if st.button("Select All", key="ka_select_all"):
-            st.session_state.papers_to_delete = {f.split("/")[-1].replace(".pdf", "") for f in files}
+            st.session_state.papers_to_delete = {arxiv_id_from_path(f) for f in files}
             st.rerun()
     with col3:
         if st.button("Clear Selection", key="ka_clear_sel"):
@@ -510,9 +547,8 @@ def ka_manager_tab():
 
     # Paper list
     for file_path in files:
-        filename = file_path.split("/")[-1]
-        arxiv_id = filename.replace(".pdf", "")
-        clean_id = arxiv_id.replace("v1", "").replace("v2", "").replace("v3", "")
+        arxiv_id = arxiv_id_from_path(file_path)
+        clean_id = split_arxiv_id(arxiv_id)[0]
 
         # Get metadata from Delta table
         paper_data = papers_lookup.get(arxiv_id, {})
@@ -560,11 +596,14 @@ def ka_manager_tab():
             st.warning(f"{selected_count} paper(s) selected for deletion")
         with col2:
             if st.button(f"🗑️ Delete {selected_count} Paper(s)", type="primary"):
-                for arxiv_id in list(st.session_state.papers_to_delete):
-                    ingestion.delete_paper(arxiv_id)
-                st.session_state.papers_to_delete = set()
-                st.success(f"Deleted {selected_count} papers")
-                st.rerun()
+                results = ingestion.delete_papers(list(st.session_state.papers_to_delete))
+                failed = [r for r in results if not r.ok]
+                st.session_state.papers_to_delete = {r.arxiv_id for r in failed}
+                if failed:
+                    st.error(f"Failed to delete {len(failed)} file(s): {failed[0].error}")
+                else:
+                    st.success(f"Deleted {selected_count} papers")
+                    st.rerun()
 
 
 # =============================================================================
@@ -1,22 +1,70 @@
 """Arxiv Demo - Paper analysis with Databricks AI."""
 
+from .backends import (
+    LocalPdfBackend,
+    ParserBackend,
+    RoutingParser,
+    RoutingPolicy,
+    WarehouseBackend,
+)
+from .cache import CacheStats, ListingCache, ParseCache, PdfCache, SearchCache
 from .config import DEFAULT_CONFIG, DatabricksConfig
 from .ingestion import (
     ArxivIngestion,
+    DeleteResult,
     DocumentParser,
+    IngestResult,
     KIEClient,
     PaperMetadata,
+    PaperMetadataBuffer,
+    PaperStatus,
+    ParseHandle,
     ParsedDocument,
+    ParsedElement,
     ExtractedPaper,
+    StagedPdf,
 )
+from .mirror import PapersMirror
+from .pdf_probe import PdfProbe
+from .pipeline import PaperPipeline, PaperResult, ParseEstimate, StageEvent
+from .sql import SqlGateway, StatementError, StatementTimeoutError
+from .versions import VersionIndex, VersionRecord
 
 __all__ = [
+    "LocalPdfBackend",
+    "ParserBackend",
+    "RoutingParser",
+    "RoutingPolicy",
+    "WarehouseBackend",
+    "CacheStats",
+    "ListingCache",
+    "ParseCache",
+    "PdfCache",
+    "SearchCache",
     "DEFAULT_CONFIG",
     "DatabricksConfig",
     "ArxivIngestion",
+    "DeleteResult",
     "DocumentParser",
+    "IngestResult",
     "KIEClient",
     "PaperMetadata",
+    "PaperMetadataBuffer",
+    "PaperStatus",
+    "ParseHandle",
     "ParsedDocument",
+    "ParsedElement",
     "ExtractedPaper",
+    "StagedPdf",
+    "PapersMirror",
+    "PdfProbe",
+    "PaperPipeline",
+    "PaperResult",
+    "ParseEstimate",
+    "StageEvent",
+    "SqlGateway",
+    "StatementError",
+    "StatementTimeoutError",
+    "VersionIndex",
+    "VersionRecord",
 ]
@@ -0,0 +1,285 @@
+"""
+Parser backends and per-document routing between them.
+
+- WarehouseBackend: ai_parse_document on the SQL warehouse (DocumentParser).
+  Layout-aware, but a parse takes minutes on a busy warehouse.
+- LocalPdfBackend: the PDF's text layer extracted in-process with pypdf.
+  Seconds per paper, but tables come out as loose text and figures are only
+  detected from captions and embedded images.
+
+RoutingParser tries the local backend first and falls back to the warehouse
+when RoutingPolicy says the local result is not good enough, e.g. because the
+paper has tables or barely any extractable text (a scanned PDF).
+"""
+
+import logging
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Protocol
+
+from databricks.sdk import WorkspaceClient
+
+from .cache import ParseCache, PdfCache
+from .config import DEFAULT_CONFIG, DatabricksConfig
+from .ingestion import (
+    DOWNLOAD_CHUNK_BYTES,
+    PDF_SPOOL_MAX_BYTES,
+    TRUNCATED_STAGING_DIR,
+    DocumentParser,
+    ParsedDocument,
+    ParsedElement,
+    arxiv_id_from_path,
+)
+
+# Only the local backend needs pypdf; without it everything goes to the warehouse
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+# LaTeX PDFs use Type1 fonts, for which pypdf warns once per font about fontTools
+logging.getLogger("pypdf").setLevel(logging.ERROR)
+
+_TABLE_CAPTION = re.compile(r"^\s*(?:Table|TABLE)\s+[0-9IVX]+\s*[.:|]", re.MULTILINE)
+_FIGURE_CAPTION = re.compile(r"^\s*(?:Figure|FIGURE|Fig\.)\s+[0-9]+\s*[.:|]", re.MULTILINE)
+
+
+class ParserBackend(Protocol):
+    """Turns a PDF in a UC volume into a ParsedDocument."""
+    name: str
+
+    def parse(
+        self,
+        volume_path: str,
+        arxiv_id: str,
+        content_sha256: str | None = None,
+        projection: bool = False,
+    ) -> ParsedDocument:
+        """With ``projection`` only text, counts and flags are needed, not elements."""
+        ...
+
+
+class WarehouseBackend:
+    """ai_parse_document through DocumentParser, including its parse cache."""
+    name = "warehouse"
+
+    def __init__(self, parser: DocumentParser | None = None):
+        self.parser = parser or DocumentParser()
+
+    def parse(
+        self,
+        volume_path: str,
+        arxiv_id: str,
+        content_sha256: str | None = None,
+        projection: bool = False,
+    ) -> ParsedDocument:
+        return self.parser.parse_document(
+            volume_path, arxiv_id, content_sha256=content_sha256, projection=projection
+        )
+
+
+def _page_has_images(page) -> bool:
+    try:
+        xobjects = page["/Resources"].get_object().get("/XObject")
+        if xobjects is None:
+            return False
+        return any(
+            xobject.get_object().get("/Subtype") == "/Image"
+            for xobject in xobjects.get_object().values()
+        )
+    except (KeyError, AttributeError, TypeError):
+        return False
+
+
+class LocalPdfBackend:
+    """Text-layer extraction with pypdf: one text element per page, plus table
+    and figure elements for captions (and figures for pages with images).
+
+    PDFs are read from the PDF cache when the download stage left them there,
+    otherwise from the volume. Results are cached on local disk by content hash.
+    """
+    name = "local"
+
+    def __init__(
+        self,
+        config: DatabricksConfig | None = None,
+        pdf_cache: PdfCache | None = None,
+    ):
+        if pypdf is None:
+            raise RuntimeError("LocalPdfBackend requires pypdf (pip install pypdf)")
+        self.config = config or DEFAULT_CONFIG
+        self.pdf_cache = pdf_cache
+        self.parse_cache = ParseCache(
+            self.config.parse_cache_dir,
+            self.version,
+            max_bytes=self.config.parse_cache_mb * 1024 * 1024,
+        )
+        self._client: WorkspaceClient | None = None
+
+    @property
+    def version(self) -> str:
+        return f"pypdf-{pypdf.__version__}"
+
+    @property
+    def client(self) -> WorkspaceClient:
+        if self._client is None:
+            self._client = WorkspaceClient(profile=self.config.profile)
+        return self._client
+
+    def _open(self, volume_path: str, arxiv_id: str) -> BinaryIO:
+        # The PDF cache holds whole PDFs, not the page-capped copies
+        if self.pdf_cache is not None and f"/{TRUNCATED_STAGING_DIR}/" not in volume_path:
+            cached = self.pdf_cache.open(arxiv_id)
+            if cached is not None:
+                return cached
+        buffer = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
+        response = self.client.files.download(volume_path)
+        with response.contents as contents:
+            while chunk := contents.read(DOWNLOAD_CHUNK_BYTES):
+                buffer.write(chunk)
+        buffer.seek(0)
+        return buffer
+
+    def parse(
+        self,
+        volume_path: str,
+        arxiv_id: str,
+        content_sha256: str | None = None,
+        projection: bool = False,
+    ) -> ParsedDocument:
+        if content_sha256:
+            cached = self.parse_cache.get(content_sha256)
+            if cached is not None:
+                doc = ParsedDocument.from_record(cached, arxiv_id)
+                return _without_elements(doc) if projection else doc
+
+        with self._open(volume_path, arxiv_id) as pdf:
+            doc = self.parse_stream(pdf, arxiv_id)
+        if content_sha256:
+            self.parse_cache.put(content_sha256, doc.to_record())
+        return _without_elements(doc) if projection else doc
+
+    def parse_stream(self, pdf: BinaryIO, arxiv_id: str) -> ParsedDocument:
+        """Extract a PDF from a seekable stream."""
+        reader = pypdf.PdfReader(pdf)
+        elements = []
+        texts = []
+        for page_number, page in enumerate(reader.pages):
+            text = (page.extract_text() or "").strip()
+            if text:
+                texts.append(text)
+                elements.append(ParsedElement(type="text", content=text, page=page_number))
+            for elem_type, pattern in (("table", _TABLE_CAPTION), ("figure", _FIGURE_CAPTION)):
+                for match in pattern.finditer(text):
+                    caption = text[match.start():].split("\n", 1)[0].strip()
+                    elements.append(
+                        ParsedElement(type=elem_type, content=caption, page=page_number)
+                    )
+            if _page_has_images(page) and not _FIGURE_CAPTION.search(text):
+                elements.append(ParsedElement(type="figure", content="", page=page_number))
+
+        return ParsedDocument(
+            arxiv_id=arxiv_id,
+            page_count=len(reader.pages),
+            elements=elements,
+            has_tables=any(e.type == "table" for e in elements),
+            has_figures=any(e.type == "figure" for e in elements),
+            text="\n\n".join(texts),
+            element_count=len(elements),
+        )
+
+
+def _without_elements(doc: ParsedDocument) -> ParsedDocument:
+    """The projected form of a document: same text, counts and flags, no elements."""
+    return ParsedDocument(
+        arxiv_id=doc.arxiv_id,
+        page_count=doc.page_count,
+        elements=[],
+        has_tables=doc.has_tables,
+        has_figures=doc.has_figures,
+        text=doc.text_content,
+        element_count=doc.element_count,
+    )
+
+
+@dataclass
+class RoutingPolicy:
+    """When a local parse is kept rather than redone on the warehouse."""
+    fallback_on_tables: bool = True
+    fallback_on_figures: bool = True
+    # Fewer extractable characters per page than this suggests a scanned PDF
+    min_chars_per_page: int = 500
+
+    def fallback_reason(self, doc: ParsedDocument) -> str | None:
+        """Why a local parse should be redone on the warehouse, or None to keep it."""
+        if doc.page_count and len(doc.text_content) / doc.page_count < self.min_chars_per_page:
+            return "little extractable text"
+        if self.fallback_on_tables and doc.has_tables:
+            return "tables detected"
+        if self.fallback_on_figures and doc.has_figures:
+            return "figures detected"
+        return None
+
+
+@dataclass
+class RoutedParse:
+    """A parse and where it came from."""
+    document: ParsedDocument
+    backend: str
+    # Why the local backend's result was not used, if it was tried
+    fallback_reason: str | None = None
+
+
+class RoutingParser:
+    """Parse each document with the local backend when the policy allows,
+    otherwise with the warehouse.
+
+    Has DocumentParser's parse_document signature, so it can stand in for it
+    in PaperPipeline. Without pypdf installed every document goes to the
+    warehouse.
+    """
+
+    def __init__(
+        self,
+        warehouse: ParserBackend | None = None,
+        local: ParserBackend | None = None,
+        policy: RoutingPolicy | None = None,
+        config: DatabricksConfig | None = None,
+        pdf_cache: PdfCache | None = None,
+    ):
+        self.config = config or DEFAULT_CONFIG
+        self.warehouse = warehouse or WarehouseBackend(DocumentParser(self.config))
+        if local is None and pypdf is not None:
+            local = LocalPdfBackend(self.config, pdf_cache=pdf_cache)
+        self.local = local
+        self.policy = policy or RoutingPolicy()
+
+    def route(
+        self,
+        volume_path: str,
+        arxiv_id: str | None = None,
+        content_sha256: str | None = None,
+        projection: bool = False,
+    ) -> RoutedParse:
+        arxiv_id = arxiv_id or arxiv_id_from_path(volume_path)
+        reason = None
+        if self.local is not None:
+            try:
+                doc = self.local.parse(volume_path, arxiv_id, content_sha256, projection)
+                reason = self.policy.fallback_reason(doc)
+                if reason is None:
+                    return RoutedParse(doc, self.local.name)
+            except Exception as e:
+                reason = f"local parse failed: {e}"
+        doc = self.warehouse.parse(volume_path, arxiv_id, content_sha256, projection)
+        return RoutedParse(doc, self.warehouse.name, reason)
+
+    def parse_document(
+        self,
+        volume_path: str,
+        arxiv_id: str,
+        content_sha256: str | None = None,
+        projection: bool = False,
+    ) -> ParsedDocument:
+        return self.route(volume_path, arxiv_id, content_sha256, projection).document
@@ -0,0 +1,575 @@
+"""
+Benchmarks for the arxiv ingestion pipeline.
+
+Each benchmark runs against the workspace configured in .env.
+
+Usage:
+    python -m src.benchmark transfer --ids 2210.03629 2303.11366 2305.04091
+    python -m src.benchmark promote --ids 2210.03629 2303.11366 --target-volume scratch
+    python -m src.benchmark upsert --rows 200 --scratch-schema scratch
+    python -m src.benchmark parse --query "cat:cs.CL" --sizes 1 10 50
+    python -m src.benchmark decode --pages 500   (offline)
+    python -m src.benchmark backends --ids 2210.03629 2303.11366 2305.04091
+"""
+
+import argparse
+import dataclasses
+import io
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+import arxiv
+
+from .backends import LocalPdfBackend, RoutingPolicy, WarehouseBackend
+from .cache import PdfCache
+from .ingestion import (
+    ArxivIngestion,
+    DocumentParser,
+    PaperMetadata,
+    ParsedDocument,
+    _to_parsed_document,
+    arxiv_id_from_path,
+)
+from .mirror import PapersMirror
+
+BENCHMARK_DIR = "_benchmark"
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _fetch_metadata(arxiv_ids: list[str]) -> list[PaperMetadata]:
+    client = arxiv.Client()
+    search = arxiv.Search(id_list=arxiv_ids)
+    return [
+        PaperMetadata(
+            arxiv_id=result.entry_id.split("/")[-1],
+            title=result.title,
+            authors=[a.name for a in result.authors],
+            abstract=result.summary,
+            published=result.published.isoformat(),
+            updated=result.updated.isoformat(),
+            categories=result.categories,
+            pdf_url=result.pdf_url,
+        )
+        for result in client.results(search)
+    ]
+
+
+# =============================================================================
+# Transfer: _temp.pdf round-trip vs streamed spooled buffer
+# =============================================================================
+
+def _transfer_legacy(ingestion: ArxivIngestion, paper: PaperMetadata, target_dir: str) -> None:
+    """The original path: download to ./_temp.pdf, read back, upload from BytesIO."""
+    client = arxiv.Client()
+    search = arxiv.Search(id_list=[paper.arxiv_id])
+    result = next(client.results(search))
+    result.download_pdf(dirpath=".", filename="_temp.pdf")
+
+    temp_path = Path("_temp.pdf")
+    pdf_content = temp_path.read_bytes()
+    temp_path.unlink()
+
+    filename = f"{paper.arxiv_id.replace('/', '_')}.pdf"
+    ingestion.client.files.upload(
+        file_path=f"{target_dir}/{filename}",
+        contents=io.BytesIO(pdf_content),
+        overwrite=True,
+    )
+
+
+def _transfer_streamed(ingestion: ArxivIngestion, paper: PaperMetadata, target_dir: str) -> None:
+    with ingestion._open_pdf(paper) as pdf:
+        ingestion._upload_pdf(paper, target_dir, pdf)
+
+
+def _transfer_worker_ingestion() -> ArxivIngestion:
+    # Cold cache so the streamed path always hits the network like the legacy one
+    return ArxivIngestion(pdf_cache=PdfCache(tempfile.mkdtemp(), 0))
+
+
+TRANSFER_MODES = {
+    "legacy": _transfer_legacy,
+    "streamed": _transfer_streamed,
+}
+
+
+def _run_transfer_worker(mode: str, arxiv_ids: list[str]) -> dict:
+    """Run one transfer mode in this process and report wall time and peak RSS."""
+    ingestion = _transfer_worker_ingestion()
+    papers = _fetch_metadata(arxiv_ids)
+    target_dir = f"{ingestion.config.staging_volume_path}/{BENCHMARK_DIR}"
+    transfer = TRANSFER_MODES[mode]
+
+    baseline_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    for paper in papers:
+        transfer(ingestion, paper, target_dir)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "papers": len(papers),
+        "wall_seconds": round(elapsed, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_rss_delta_mb": round(_peak_rss_mb() - baseline_rss, 1),
+    }
+
+
+def benchmark_transfer(arxiv_ids: list[str]) -> list[dict]:
+    """Compare transfer modes, each in a fresh interpreter so peak RSS is not shared."""
+    results = []
+    for mode in TRANSFER_MODES:
+        print(f"Running transfer benchmark: {mode}...")
+        proc = subprocess.run(
+            [sys.executable, "-m", "src.benchmark", "transfer", "--worker", mode,
+             "--ids", *arxiv_ids],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return results
+
+
+# =============================================================================
+# Promote: re-upload from session bytes vs copy from the staging volume
+# =============================================================================
+
+def benchmark_promote(arxiv_ids: list[str], target_volume: str) -> list[dict]:
+    """Time staging -> volume promotion, writing into ``target_volume`` instead of KA.
+
+    Papers are staged first (untimed). ``session_bytes`` is the old flow, where the
+    app kept every PDF in memory between Review and KA phases and re-uploaded it.
+    """
+    ingestion = ArxivIngestion()
+    papers = _fetch_metadata(arxiv_ids)
+    print(f"Staging {len(papers)} papers...")
+    staged = {p.arxiv_id: ingestion.download_to_staging(p) for p in papers}
+
+    target_config = dataclasses.replace(ingestion.config, volume=target_volume)
+    results = []
+
+    # Old flow: bytes held in session state, uploaded again
+    held = {
+        p.arxiv_id: ingestion.client.files.download(staged[p.arxiv_id].path).contents.read()
+        for p in papers
+    }
+    target = ArxivIngestion(target_config)
+    start = time.perf_counter()
+    for paper in papers:
+        target._upload_pdf(paper, target_config.volume_path, io.BytesIO(held[paper.arxiv_id]))
+    results.append({
+        "mode": "session_bytes",
+        "papers": len(papers),
+        "wall_seconds": round(time.perf_counter() - start, 2),
+        "held_mb": round(sum(len(b) for b in held.values()) / 1024 / 1024, 1),
+    })
+    del held
+
+    # New flow, cold local cache: stream from the staging volume
+    with tempfile.TemporaryDirectory() as empty_cache_dir:
+        target = ArxivIngestion(target_config, pdf_cache=PdfCache(empty_cache_dir, 0))
+        start = time.perf_counter()
+        for paper in papers:
+            target._promote_file(paper, staged[paper.arxiv_id].path)
+        results.append({
+            "mode": "staging_stream",
+            "papers": len(papers),
+            "wall_seconds": round(time.perf_counter() - start, 2),
+            "held_mb": 0.0,
+        })
+
+    # New flow, warm local cache (populated while staging)
+    target = ArxivIngestion(target_config)
+    start = time.perf_counter()
+    for paper in papers:
+        target._promote_file(paper, staged[paper.arxiv_id].path)
+    results.append({
+        "mode": "local_cache",
+        "papers": len(papers),
+        "wall_seconds": round(time.perf_counter() - start, 2),
+        "held_mb": 0.0,
+    })
+
+    return results
+
+
+# =============================================================================
+# Upsert: per-paper DELETE + INSERT vs one batched MERGE
+# =============================================================================
+
+def _synthetic_papers(n: int) -> list[PaperMetadata]:
+    return [
+        PaperMetadata(
+            arxiv_id=f"9999.{i:05d}v1",
+            title=f"Benchmark paper {i}: it's a \"quoted\" title",
+            authors=[f"Author {i}", "O'Brien"],
+            abstract="Lorem ipsum dolor sit amet. " * 40,
+            published="2024-01-01T00:00:00+00:00",
+            updated="2024-01-02T00:00:00+00:00",
+            categories=["cs.CL", "cs.AI"],
+            pdf_url=f"https://arxiv.org/pdf/9999.{i:05d}v1",
+            volume_path=f"/Volumes/bench/bench/bench/9999.{i:05d}v1.pdf",
+        )
+        for i in range(n)
+    ]
+
+
+def _save_legacy(ingestion: ArxivIngestion, paper: PaperMetadata) -> None:
+    """The original path: DELETE then INSERT with hand-escaped literals."""
+
+    def escape(s: str) -> str:
+        return s.replace("'", "''")
+
+    authors_sql = ", ".join([f"'{escape(a)}'" for a in paper.authors])
+    categories_sql = ", ".join([f"'{c}'" for c in paper.categories])
+    table = f"{ingestion.config.full_schema}.papers"
+
+    delete_sql = f"DELETE FROM {table} WHERE arxiv_id = '{paper.arxiv_id}'"
+    insert_sql = f"""
+    INSERT INTO {table} (
+        arxiv_id, title, authors, abstract, published_date, updated_date,
+        categories, pdf_url, volume_path, in_knowledge_assistant, ingested_at
+    ) VALUES (
+        '{paper.arxiv_id}', '{escape(paper.title)}', ARRAY({authors_sql}),
+        '{escape(paper.abstract)}', TIMESTAMP'{paper.published}', TIMESTAMP'{paper.updated}',
+        ARRAY({categories_sql}), '{paper.pdf_url}', '{paper.volume_path}',
+        TRUE, CURRENT_TIMESTAMP()
+    )
+    """
+    for sql in (delete_sql, insert_sql):
+        _execute(ingestion, sql)
+
+
+def _execute(ingestion: ArxivIngestion, sql: str):
+    return ingestion.sql.execute(sql)
+
+
+def _table_version(ingestion: ArxivIngestion) -> int:
+    response = _execute(
+        ingestion,
+        f"SELECT max(version) FROM (DESCRIBE HISTORY {ingestion.config.full_schema}.papers)",
+    )
+    return int(response.result.data_array[0][0])
+
+
+def benchmark_upsert(rows: int, scratch_schema: str) -> list[dict]:
+    """Compare metadata save paths on a scratch copy of the papers table.
+
+    Each mode inserts then re-saves (updates) the same synthetic rows, and reports
+    wall time, statement round-trips and Delta commits. Upserts are mirrored into
+    a throwaway local mirror, and the synthetic rows are deleted afterwards.
+    """
+    source = ArxivIngestion()
+    ingestion = ArxivIngestion(
+        dataclasses.replace(source.config, schema=scratch_schema),
+        mirror=PapersMirror(Path(tempfile.mkdtemp()) / "papers.db"),
+    )
+    _execute(ingestion, f"CREATE SCHEMA IF NOT EXISTS {ingestion.config.full_schema}")
+    _execute(
+        ingestion,
+        f"CREATE OR REPLACE TABLE {ingestion.config.full_schema}.papers "
+        f"LIKE {source.config.full_schema}.papers",
+    )
+    papers = _synthetic_papers(rows)
+
+    def legacy(batch: list[PaperMetadata]) -> int:
+        for paper in batch:
+            _save_legacy(ingestion, paper)
+        return 2 * len(batch)
+
+    def merge(batch: list[PaperMetadata]) -> int:
+        ingestion.upsert_papers(batch)
+        return 1
+
+    results = []
+    try:
+        for mode, save in (("delete_insert", legacy), ("merge", merge)):
+            _execute(ingestion, f"DELETE FROM {ingestion.config.full_schema}.papers")
+            for phase in ("insert", "update"):
+                print(f"Running upsert benchmark: {mode} ({phase})...")
+                version_before = _table_version(ingestion)
+                start = time.perf_counter()
+                statements = save(papers)
+                elapsed = time.perf_counter() - start
+                results.append({
+                    "mode": mode,
+                    "phase": phase,
+                    "rows": rows,
+                    "statements": statements,
+                    "commits": _table_version(ingestion) - version_before,
+                    "wall_seconds": round(elapsed, 2),
+                })
+    finally:
+        _execute(ingestion, f"DELETE FROM {ingestion.config.full_schema}.papers")
+        # Earlier runs mirrored the synthetic rows into the real mirror
+        source.mirror.delete(p.arxiv_id for p in papers)
+    return results
+
+
+# =============================================================================
+# Parse: one statement per paper vs one statement per batch
+# =============================================================================
+
+def benchmark_parse(query: str, sizes: list[int], sequential_max: int) -> list[dict]:
+    """Compare parse_document per paper with parse_documents per batch.
+
+    The first max(sizes) results for ``query`` are staged once (untimed). Each
+    size then parses that many staged PDFs; the per-paper baseline runs only up
+    to ``sequential_max`` papers since it takes minutes per paper.
+    """
+    ingestion = ArxivIngestion()
+    parser = DocumentParser(ingestion.config)
+    papers = ingestion.search_papers(query, max_results=max(sizes))
+    print(f"Staging {len(papers)} papers...")
+    paths = [ingestion.download_to_staging(p).path for p in papers]
+
+    results = []
+    for size in sizes:
+        batch = paths[:size]
+
+        if size <= sequential_max:
+            print(f"Running parse benchmark: sequential ({size})...")
+            start = time.perf_counter()
+            parsed = 0
+            for path in batch:
+                try:
+                    parser.parse_document(path, arxiv_id_from_path(path))
+                    parsed += 1
+                except Exception as e:
+                    print(f"  {path}: {e}")
+            elapsed = time.perf_counter() - start
+            results.append({
+                "mode": "sequential",
+                "papers": len(batch),
+                "parsed": parsed,
+                "statements": len(batch),
+                "wall_seconds": round(elapsed, 1),
+                "papers_per_min": round(parsed / elapsed * 60, 2),
+            })
+
+        print(f"Running parse benchmark: batch ({size})...")
+        start = time.perf_counter()
+        documents = parser.parse_documents(batch)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "mode": "batch",
+            "papers": len(batch),
+            "parsed": len(documents),
+            "statements": 1,
+            "wall_seconds": round(elapsed, 1),
+            "papers_per_min": round(len(documents) / elapsed * 60, 2),
+        })
+    return results
+
+
+# =============================================================================
+# Backends: warehouse ai_parse_document vs local pypdf text extraction
+# =============================================================================
+
+def _word_overlap(reference: str, candidate: str) -> tuple[float, float]:
+    """Bag-of-words recall and precision of ``candidate`` against ``reference``."""
+    ref = Counter(reference.lower().split())
+    cand = Counter(candidate.lower().split())
+    common = sum((ref & cand).values())
+    return common / max(sum(ref.values()), 1), common / max(sum(cand.values()), 1)
+
+
+def benchmark_backends(arxiv_ids: list[str]) -> list[dict]:
+    """Parse the same staged PDFs with each backend, uncached.
+
+    Local timings include reading the PDF back from the volume. Text fidelity
+    is word overlap with the warehouse text; ``route`` is what the default
+    RoutingPolicy would pick for the paper.
+    """
+    ingestion = ArxivIngestion()
+    warehouse = WarehouseBackend(DocumentParser(ingestion.config, sql=ingestion.sql))
+    local = LocalPdfBackend(ingestion.config)
+    policy = RoutingPolicy()
+    papers = _fetch_metadata(arxiv_ids)
+    print(f"Staging {len(papers)} papers...")
+    staged = {p.arxiv_id: ingestion.download_to_staging(p) for p in papers}
+
+    results = []
+    for paper in papers:
+        path = staged[paper.arxiv_id].path
+        print(f"Running backends benchmark: {paper.arxiv_id}...")
+        start = time.perf_counter()
+        local_doc = local.parse(path, paper.arxiv_id, projection=True)
+        local_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        warehouse_doc = warehouse.parse(path, paper.arxiv_id, projection=True)
+        warehouse_seconds = time.perf_counter() - start
+
+        recall, precision = _word_overlap(warehouse_doc.text_content, local_doc.text_content)
+        results.append({
+            "arxiv_id": paper.arxiv_id,
+            "pages": warehouse_doc.page_count,
+            "warehouse_seconds": round(warehouse_seconds, 1),
+            "local_seconds": round(local_seconds, 2),
+            "word_recall": round(recall, 3),
+            "word_precision": round(precision, 3),
+            "tables": f"{warehouse_doc.has_tables}/{local_doc.has_tables}",
+            "figures": f"{warehouse_doc.has_figures}/{local_doc.has_figures}",
+            "route": policy.fallback_reason(local_doc) or "local",
+        })
+    return results
+
+
+# =============================================================================
+# Decode: json.loads of the whole parse result vs streaming element decode
+# =============================================================================
+
+def _synthetic_parse_result(pages: int, elements_per_page: int = 25) -> str:
+    """An ai_parse_document-shaped JSON result with realistic per-element overhead."""
+    types = ["text"] * 20 + ["section_header", "table", "figure", "caption", "page_footer"]
+    elements = []
+    for page in range(pages):
+        for j in range(elements_per_page):
+            elem_type = types[j % len(types)]
+            elements.append({
+                "id": len(elements),
+                "type": elem_type,
+                "content": f"Sentence {j} on page {page} about attention and retrieval. " * 6,
+                "bbox": [{"coord": [72.0, 90.5 + j, 540.0, 110.25 + j], "page_id": page}],
+                "description": "A chart of results." if elem_type == "figure" else None,
+            })
+    return json.dumps({
+        "document": {
+            "pages": [{"id": p, "image_uri": f"/Volumes/x/y/z/page_{p}.png"} for p in range(pages)],
+            "elements": elements,
+        },
+        "error_status": [],
+        "metadata": {"id": "synthetic", "version": "2.0", "page_count": pages},
+    })
+
+
+def _decode_legacy(raw: str) -> tuple[list[dict], str]:
+    """The original path: json.loads the whole result, keep every element dict."""
+    elements = json.loads(raw).get("document", {}).get("elements", [])
+    text = "\n\n".join(e.get("content", "") for e in elements if e.get("type") == "text")
+    return elements, text
+
+
+def _decode_stream(raw: str, keep_elements: bool) -> tuple[ParsedDocument, str]:
+    doc = _to_parsed_document(raw, "synthetic", keep_elements=keep_elements)
+    return doc, doc.text_content
+
+
+DECODE_MODES = {
+    "json_loads": _decode_legacy,
+    "stream_keep_elements": lambda raw: _decode_stream(raw, keep_elements=True),
+    "stream_text_only": lambda raw: _decode_stream(raw, keep_elements=False),
+}
+
+
+def benchmark_decode(pages: int) -> list[dict]:
+    """Peak and retained Python allocation (beyond the raw string) while decoding to text."""
+    raw = _synthetic_parse_result(pages)
+    results = []
+    for mode, decode in DECODE_MODES.items():
+        print(f"Running decode benchmark: {mode}...")
+        tracemalloc.start()
+        start = time.perf_counter()
+        kept, text = decode(raw)
+        text_chars = len(text)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append({
+            "mode": mode,
+            "pages": pages,
+            "raw_mb": round(len(raw) / 1024 / 1024, 1),
+            "text_chars": text_chars,
+            "peak_mb": round(peak / 1024 / 1024, 1),
+            "retained_mb": round(retained / 1024 / 1024, 1),
+            "wall_seconds": round(elapsed, 3),
+        })
+        del kept, text
+    return results
+
+
+def _print_table(rows: list[dict]) -> None:
+    if not rows:
+        return
+    columns = list(rows[0].keys())
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    print("  ".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the arxiv ingestion pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    transfer = subparsers.add_parser("transfer", help="Temp-file vs streamed PDF transfer")
+    transfer.add_argument("--ids", nargs="+", required=True, help="Arxiv IDs to transfer")
+    transfer.add_argument("--worker", choices=list(TRANSFER_MODES), help=argparse.SUPPRESS)
+
+    promote = subparsers.add_parser("promote", help="Session-bytes vs staged KA promotion")
+    promote.add_argument("--ids", nargs="+", required=True, help="Arxiv IDs to promote")
+    promote.add_argument(
+        "--target-volume", required=True,
+        help="Scratch volume in the configured schema to promote into (not the KA volume)",
+    )
+
+    upsert = subparsers.add_parser("upsert", help="DELETE + INSERT vs batched MERGE")
+    upsert.add_argument("--rows", type=int, default=200, help="Synthetic papers to save")
+    upsert.add_argument(
+        "--scratch-schema", required=True,
+        help="Schema (in the configured catalog) for a throwaway copy of the papers table",
+    )
+
+    parse = subparsers.add_parser("parse", help="Per-paper vs batched ai_parse_document")
+    parse.add_argument("--query", required=True, help="Arxiv query supplying the papers to parse")
+    parse.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50], help="Batch sizes")
+    parse.add_argument(
+        "--sequential-max", type=int, default=10,
+        help="Largest size to also run one statement per paper for",
+    )
+
+    backends = subparsers.add_parser(
+        "backends", help="Warehouse vs local parser latency and text fidelity"
+    )
+    backends.add_argument("--ids", nargs="+", required=True, help="arxiv IDs to parse")
+
+    decode = subparsers.add_parser(
+        "decode", help="Whole-result vs streaming parse decode (offline)"
+    )
+    decode.add_argument("--pages", type=int, default=500, help="Pages in the synthetic result")
+
+    args = parser.parse_args()
+
+    if args.command == "transfer":
+        if args.worker:
+            print(json.dumps(_run_transfer_worker(args.worker, args.ids)))
+            return
+        _print_table(benchmark_transfer(args.ids))
+    elif args.command == "promote":
+        _print_table(benchmark_promote(args.ids, args.target_volume))
+    elif args.command == "upsert":
+        _print_table(benchmark_upsert(args.rows, args.scratch_schema))
+    elif args.command == "parse":
+        _print_table(benchmark_parse(args.query, args.sizes, args.sequential_max))
+    elif args.command == "backends":
+        _print_table(benchmark_backends(args.ids))
+    elif args.command == "decode":
+        _print_table(benchmark_decode(args.pages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,598 @@
+"""
+Local caches for the ingestion layer.
+
+PdfCache stores arxiv PDFs content-addressed by sha256, keyed by versioned
+arxiv ID, with a byte-size cap and least-recently-used eviction.
+
+SearchCache keeps arxiv search results in memory for the whole process, so
+identical queries from different sessions or reruns share one arxiv round-trip.
+
+ListingCache keeps volume directory listings so reruns do not re-list a volume
+that has not changed.
+
+ParseCache keeps ai_parse_document output keyed by PDF sha256 and parser
+version, on local disk (size-capped, least recently used evicted first) in
+front of a Delta table.
+"""
+
+import dataclasses
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Hashable, Iterable, Iterator, Sequence
+
+from .sql import SqlGateway
+
+# No cross-process index locking on Windows; instances there should not share a directory
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_VERSIONED_ID = re.compile(r"v\d+$")
+_CHUNK_BYTES = 1024 * 1024
+_PARSE_CACHE_SCHEMA = "sha256 STRING, parser_version STRING, document STRING"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss/eviction counters for a cache."""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """On-disk, content-addressed PDF cache with LRU eviction.
+
+    Entries are keyed by versioned arxiv ID (e.g. ``2411.15138v2``) and point to a
+    blob named by the sha256 of its bytes, so identical PDFs are stored once.
+    A blob is re-hashed the first time this instance reads it; a corrupt blob is
+    dropped and counted as a miss. Unversioned IDs are never cached since the PDF
+    behind them can change.
+
+    Several instances (and processes) can share a directory: every index write
+    re-reads index.json under a file lock and merges into it, and blobs no entry
+    refers to are deleted on eviction.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        # key -> {"sha256": str, "size": int, "last_access": float}
+        self._index: dict[str, dict] = self._load_index()
+        # Blobs this instance has hashed and found intact
+        self._verified: set[str] = set()
+
+    @property
+    def _index_path(self) -> Path:
+        return self.directory / "index.json"
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self.directory / "blobs" / f"{sha256}.pdf"
+
+    def _load_index(self) -> dict[str, dict]:
+        try:
+            return json.loads(self._index_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._index))
+        os.replace(tmp_path, self._index_path)
+
+    def _reload_index(self) -> None:
+        """Adopt the index on disk, keeping this instance's newer access times."""
+        index = self._load_index()
+        for key, entry in index.items():
+            mine = self._index.get(key)
+            if mine is not None and mine["sha256"] == entry["sha256"]:
+                entry["last_access"] = max(entry["last_access"], mine["last_access"])
+        self._index = index
+
+    @contextmanager
+    def _writing_index(self) -> Iterator[None]:
+        """Reload the index under the thread and file locks, and save it on exit."""
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / "index.lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._reload_index()
+                yield
+                self._save_index()
+
+    @staticmethod
+    def cacheable(arxiv_id: str) -> bool:
+        """Whether an ID pins a specific version and so has immutable content."""
+        return bool(_VERSIONED_ID.search(arxiv_id))
+
+    @property
+    def stats(self) -> CacheStats:
+        """Snapshot of the counters and current footprint."""
+        with self._lock:
+            return CacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                entries=len(self._index),
+                size_bytes=self._total_bytes(),
+            )
+
+    def _total_bytes(self) -> int:
+        blobs = {entry["sha256"]: entry["size"] for entry in self._index.values()}
+        return sum(blobs.values())
+
+    def open(self, arxiv_id: str) -> BinaryIO | None:
+        """Open the cached PDF for an ID, or return None on a miss."""
+        if not self.cacheable(arxiv_id):
+            return None
+
+        with self._lock:
+            if arxiv_id not in self._index:
+                # Another instance may have cached it since the index was read
+                self._reload_index()
+            entry = self._index.get(arxiv_id)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            sha256 = entry["sha256"]
+            verified = sha256 in self._verified
+            if verified:
+                # Persisted with the next index write
+                entry["last_access"] = time.time()
+
+        blob_path = self._blob_path(sha256)
+        if not verified:
+            try:
+                valid = _sha256_file(blob_path) == sha256
+            except FileNotFoundError:
+                valid = False
+            with self._writing_index():
+                entry = self._index.get(arxiv_id)
+                if entry is not None and entry["sha256"] == sha256:
+                    if valid:
+                        entry["last_access"] = time.time()
+                        self._verified.add(sha256)
+                    else:
+                        self._remove(arxiv_id)
+            if not valid:
+                with self._lock:
+                    self._stats.misses += 1
+                return None
+
+        try:
+            pdf = open(blob_path, "rb")
+        except FileNotFoundError:
+            # Evicted by another instance
+            with self._lock:
+                self._verified.discard(sha256)
+                self._stats.misses += 1
+            return None
+        with self._lock:
+            self._stats.hits += 1
+        return pdf
+
+    def put(self, arxiv_id: str, contents: BinaryIO) -> str | None:
+        """Copy a PDF stream into the cache. Returns its sha256, or None if not cacheable.
+
+        Reads ``contents`` from its current position to the end; the caller is
+        responsible for rewinding it afterwards if it is reused.
+        """
+        if not self.cacheable(arxiv_id):
+            return None
+
+        blobs_dir = self.directory / "blobs"
+        blobs_dir.mkdir(parents=True, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=blobs_dir, suffix=".part", delete=False) as tmp:
+            while chunk := contents.read(_CHUNK_BYTES):
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+
+        if size > self.max_bytes:
+            os.unlink(tmp.name)
+            return sha256
+
+        with self._writing_index():
+            blob_path = self._blob_path(sha256)
+            if blob_path.exists():
+                os.unlink(tmp.name)
+            else:
+                os.replace(tmp.name, blob_path)
+
+            self._index[arxiv_id] = {"sha256": sha256, "size": size, "last_access": time.time()}
+            # Written from memory, so it need not be hashed again on the first read
+            self._verified.add(sha256)
+            self._evict()
+        return sha256
+
+    def _evict(self) -> None:
+        """Drop least-recently-used entries until the cache fits in max_bytes.
+
+        Also deletes blobs no entry refers to, e.g. ones whose index entries
+        were lost to concurrent writers before the index was locked.
+        """
+        by_age = sorted(self._index, key=lambda k: self._index[k]["last_access"])
+        while by_age and self._total_bytes() > self.max_bytes:
+            self._remove(by_age.pop(0))
+            self._stats.evictions += 1
+        referenced = {entry["sha256"] for entry in self._index.values()}
+        for blob_path in (self.directory / "blobs").glob("*.pdf"):
+            if blob_path.stem not in referenced:
+                blob_path.unlink(missing_ok=True)
+
+    def _remove(self, arxiv_id: str) -> None:
+        """Remove an entry, deleting its blob once no other entry references it."""
+        entry = self._index.pop(arxiv_id)
+        still_referenced = any(e["sha256"] == entry["sha256"] for e in self._index.values())
+        if not still_referenced:
+            self._blob_path(entry["sha256"]).unlink(missing_ok=True)
+            self._verified.discard(entry["sha256"])
+
+
+@dataclass
+class SearchEntry:
+    """Results fetched so far for one query, in arxiv order."""
+    results: list[Any]
+    exhausted: bool = False
+    fetched_at: float = field(default_factory=time.monotonic)
+
+
+class SearchCache:
+    """In-memory search result cache with TTL and LRU eviction.
+
+    Entries are keyed by query and sort, not by result count: a larger
+    ``max_results`` extends an existing entry instead of replacing it.
+    """
+
+    def __init__(self, ttl_seconds: float = 600.0, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, SearchEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Collapse whitespace; case is kept since arxiv's AND/OR/ANDNOT are case-sensitive."""
+        return " ".join(query.split())
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                entries=len(self._entries),
+            )
+
+    def lookup(self, key: Hashable, count: int) -> tuple[SearchEntry | None, bool]:
+        """Find the entry for a key and whether it can serve ``count`` results.
+
+        Returns (entry, hit). An expired entry is dropped and reported as None.
+        A live entry with too few results is returned with hit=False so the
+        caller can fetch only the missing tail.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry.fetched_at > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._stats.misses += 1
+                return None, False
+
+            self._entries.move_to_end(key)
+            hit = entry.exhausted or len(entry.results) >= count
+            if hit:
+                self._stats.hits += 1
+            else:
+                self._stats.misses += 1
+            return entry, hit
+
+    def store(self, key: Hashable, entry: SearchEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+
+@dataclass
+class ListingSnapshot:
+    """File paths seen in one volume directory."""
+    paths: set[str]
+    fetched_at: float = field(default_factory=time.monotonic)
+
+
+class ListingCache:
+    """Volume directory listings, kept current by this process's own writes.
+
+    The Files API exposes no directory modification time to compare against, so
+    a snapshot is trusted for ``ttl_seconds`` to catch changes made elsewhere.
+    Uploads and deletes made in this process patch the snapshot in place instead
+    of invalidating it. Each write also bumps a per-directory generation, so a
+    listing that raced with a write is discarded rather than stored.
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0):
+        self.ttl_seconds = ttl_seconds
+        self._snapshots: dict[str, ListingSnapshot] = {}
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    @staticmethod
+    def _key(directory: str) -> str:
+        return directory.rstrip("/")
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                entries=sum(len(s.paths) for s in self._snapshots.values()),
+            )
+
+    def get(self, directory: str) -> list[str] | None:
+        """Sorted paths from a live snapshot, or None if a listing is needed."""
+        key = self._key(directory)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot and time.monotonic() - snapshot.fetched_at > self.ttl_seconds:
+                del self._snapshots[key]
+                snapshot = None
+            if snapshot is None:
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+            return sorted(snapshot.paths)
+
+    def generation(self, directory: str) -> int:
+        """Current write generation; pass it to store() after listing."""
+        with self._lock:
+            return self._generations.get(self._key(directory), 0)
+
+    def store(self, directory: str, paths: Iterable[str], generation: int) -> bool:
+        """Save a full listing taken at ``generation``. Returns False if it went stale."""
+        key = self._key(directory)
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return False
+            self._snapshots[key] = ListingSnapshot(paths=set(paths))
+            return True
+
+    def record_added(self, directory: str, path: str) -> None:
+        self._record(directory, lambda paths: paths.add(path))
+
+    def record_removed(self, directory: str, path: str) -> None:
+        self._record(directory, lambda paths: paths.discard(path))
+
+    def _record(self, directory: str, change: Callable[[set[str]], None]) -> None:
+        key = self._key(directory)
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                change(snapshot.paths)
+
+    def invalidate(self, directory: str) -> None:
+        """Drop a snapshot so the next read lists the volume again."""
+        with self._lock:
+            self._snapshots.pop(self._key(directory), None)
+
+
+class ParseCache:
+    """Two-tier cache of parse results keyed by PDF content hash and parser version.
+
+    The fast tier is gzipped JSON on local disk, one file per hash, holding at
+    most ``max_bytes`` (unbounded if None); the least recently read files are
+    evicted first. The durable tier is a Delta table shared by every app
+    instance and notebook; hits there are copied into the local tier. Records
+    are plain dicts (the fields of a ParsedDocument). A durable tier that is
+    unreachable is treated as a miss.
+
+    Durable writes stage the record as a JSONL file in ``staging_dir`` (a
+    volume directory) and MERGE it from there, so the statement stays small
+    however large the document is. Without ``staging_dir`` only the local tier
+    is written.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        parser_version: str,
+        sql: SqlGateway | None = None,
+        table: str | None = None,
+        staging_dir: str | None = None,
+        max_bytes: int | None = None,
+    ):
+        self.directory = Path(directory) / parser_version
+        self.parser_version = parser_version
+        self.sql = sql
+        self.table = table
+        self.staging_dir = staging_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    def _path(self, sha256: str) -> Path:
+        return self.directory / f"{sha256}.json.gz"
+
+    def _read_local(self, sha256: str) -> dict | None:
+        path = self._path(sha256)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                record = json.load(f)
+        except (FileNotFoundError, EOFError, OSError, json.JSONDecodeError):
+            return None
+        try:
+            # The modification time doubles as the last access for eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return record
+
+    def _write_local(self, sha256: str, record: dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".part", delete=False) as tmp:
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(record, f)
+        os.replace(tmp.name, self._path(sha256))
+        if self.max_bytes is not None:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used files until the local tier fits in max_bytes."""
+        files = []
+        for path in self.directory.glob("*.json.gz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            with self._lock:
+                self._stats.evictions += 1
+
+    def get(self, sha256: str) -> dict | None:
+        return self.get_many([sha256]).get(sha256)
+
+    def get_many(self, sha256s: Sequence[str]) -> dict[str, dict]:
+        """Cached records for whichever hashes have one, with one durable query for local misses."""
+        found = {}
+        for sha256 in dict.fromkeys(sha256s):
+            record = self._read_local(sha256)
+            if record is not None:
+                found[sha256] = record
+
+        missing = [s for s in dict.fromkeys(sha256s) if s not in found]
+        if missing and self.sql is not None and self.table:
+            try:
+                for sha256, record in self._read_durable(missing):
+                    self._write_local(sha256, record)
+                    found[sha256] = record
+            except Exception:
+                pass
+
+        with self._lock:
+            self._stats.hits += len(found)
+            self._stats.misses += len(set(sha256s)) - len(found)
+        return found
+
+    def _read_durable(self, sha256s: list[str]) -> Iterable[tuple[str, dict]]:
+        parameters = {f"sha_{i}": sha256 for i, sha256 in enumerate(sha256s)}
+        parameters["parser_version"] = self.parser_version
+        placeholders = ", ".join(f":sha_{i}" for i in range(len(sha256s)))
+        sql = f"""
+        SELECT sha256, document FROM {self.table}
+        WHERE parser_version = :parser_version AND sha256 IN ({placeholders})
+        """
+        for batch in self.sql.iter_arrow(sql, parameters):
+            for row in batch.to_pylist():
+                yield row["sha256"], json.loads(row["document"])
+
+    def put(self, sha256: str, record: dict) -> Future:
+        """Store a record locally now and durably in the background.
+
+        Returns the future of the durable write; callers may ignore it, since a
+        failed durable write is logged.
+        """
+        self._write_local(sha256, record)
+        done = Future()
+        if self.sql is None or not self.table or not self.staging_dir:
+            done.set_result(None)
+            return done
+
+        def write() -> None:
+            path = f"{self.staging_dir}/{uuid.uuid4().hex}.jsonl"
+            row = {
+                "sha256": sha256,
+                "parser_version": self.parser_version,
+                "document": json.dumps(record),
+            }
+            sql = f"""
+            MERGE INTO {self.table} AS target
+            USING (
+                SELECT sha256, parser_version, document
+                FROM read_files(:path, format => 'json', schema => '{_PARSE_CACHE_SCHEMA}')
+            ) AS source
+            ON target.sha256 = source.sha256 AND target.parser_version = source.parser_version
+            WHEN NOT MATCHED THEN INSERT (sha256, parser_version, document, cached_at)
+            VALUES (source.sha256, source.parser_version, source.document, CURRENT_TIMESTAMP())
+            """
+            files = self.sql.client.files
+            try:
+                contents = io.BytesIO(json.dumps(row).encode("utf-8") + b"\n")
+                files.upload(file_path=path, contents=contents, overwrite=True)
+                try:
+                    done.set_result(self.sql.submit(sql, {"path": path}).result())
+                finally:
+                    try:
+                        files.delete(path)
+                    except Exception:
+                        pass  # Leftover staging files are harmless
+            except Exception as e:
+                logger.warning("Could not write parse cache entry %s durably: %s", sha256, e)
+                done.set_exception(e)
+
+        # Off the caller's thread, and not in a callback on the gateway's poller
+        threading.Thread(target=write, name="parse-cache-write", daemon=True).start()
+        return done
+
+
+# Shared by every ArxivIngestion in the process
+SEARCH_CACHE = SearchCache()
+LISTING_CACHE = ListingCache()
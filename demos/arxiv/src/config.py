@@ -46,6 +46,17 @@ class DatabricksConfig:
     # KIE Agent endpoint (required for extraction)
     kie_endpoint: str = field(default_factory=lambda: _get_env("KIE_ENDPOINT", ""))
 
+    # Local working directory for caches
+    data_dir: str = field(default_factory=lambda: _get_env("ARXIV_DATA_DIR", ".arxiv_data"))
+
+    # Size cap for the local PDF cache, in MB
+    pdf_cache_mb: int = field(default_factory=lambda: int(_get_env("ARXIV_PDF_CACHE_MB", "512")))
+
+    # Size cap for the local parse cache (each parser version separately), in MB
+    parse_cache_mb: int = field(
+        default_factory=lambda: int(_get_env("ARXIV_PARSE_CACHE_MB", "1024"))
+    )
+
     @property
     def volume_path(self) -> str:
         return f"/Volumes/{self.catalog}/{self.schema}/{self.volume}"
@@ -54,6 +65,22 @@ class DatabricksConfig:
     def staging_volume_path(self) -> str:
         return f"/Volumes/{self.catalog}/{self.schema}/{self.staging_volume}"
 
+    @property
+    def pdf_cache_dir(self) -> str:
+        return os.path.join(self.data_dir, "pdf_cache")
+
+    @property
+    def parse_cache_dir(self) -> str:
+        return os.path.join(self.data_dir, "parse_cache")
+
+    @property
+    def mirror_path(self) -> str:
+        return os.path.join(self.data_dir, "papers.sqlite")
+
+    @property
+    def version_index_path(self) -> str:
+        return os.path.join(self.data_dir, "versions.sqlite")
+
     @property
     def full_schema(self) -> str:
         return f"{self.catalog}.{self.schema}"
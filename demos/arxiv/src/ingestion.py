@@ -8,24 +8,111 @@ Handles the full pipeline:
 - Extract structured fields with KIE agent
 """
 
-import io
+import dataclasses
+import hashlib
 import json
+import logging
+import re
+import sys
+import tempfile
+import threading
 import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from pathlib import Path
+from enum import Enum
+from functools import cached_property
+from typing import BinaryIO, Iterable, Iterator, Sequence
 
 import arxiv
+import requests
+import requests.adapters
 from databricks.sdk import WorkspaceClient
+from databricks.sdk.errors import NotFound
 from databricks.sdk.service.serving import ChatMessage, ChatMessageRole
-from databricks.sdk.service.sql import StatementState
 
+from .cache import (
+    LISTING_CACHE,
+    SEARCH_CACHE,
+    ListingCache,
+    ParseCache,
+    PdfCache,
+    SearchCache,
+    SearchEntry,
+)
 from .config import DEFAULT_CONFIG, DatabricksConfig
+from .mirror import MIRROR_COLUMNS, PapersMirror, utc_now_iso
+from .parse_stream import iter_elements
+from .pdf_probe import PdfProbe, first_pages, probe_pdf
+from .sql import SqlGateway, StatementFuture, run_when_done
+from .versions import VersionIndex, VersionRecord
+
+logger = logging.getLogger(__name__)
+
+# ai_parse_document on a busy warehouse can take a couple of minutes to run,
+# and may wait longer than that in the queue before it starts
+PARSE_TIMEOUT_SECONDS = 170
+PARSE_DEADLINE_SECONDS = 900
+# Namespaces the parse cache; bump when the parse statement or its output handling changes
+PARSER_VERSION = "ai_parse_document-1"
+# A batch is parsed in parallel by the warehouse but still takes longer than one paper
+BATCH_PARSE_TIMEOUT_SECONDS = 600
+# Parsed rows are staged here (under the staging volume) for bulk loading
+PARSED_STAGING_DIR = "_parsed"
+# Parse cache records are staged here for loading into the parse_cache table
+PARSE_CACHE_STAGING_DIR = "_parse_cache"
+# Page-capped copies of long PDFs are staged here for parsing
+TRUNCATED_STAGING_DIR = "_truncated"
+_PARSED_DOCUMENT_SCHEMA = (
+    "arxiv_id STRING, parsed_content STRING, page_count INT, element_count INT, "
+    "has_tables BOOLEAN, has_figures BOOLEAN"
+)
+_PARSED_ELEMENT_SCHEMA = (
+    "arxiv_id STRING, element_index INT, type STRING, page INT, content STRING, "
+    "description STRING, bbox ARRAY<DOUBLE>"
+)
+
+PAPER_COLUMNS = (
+    "arxiv_id", "title", "authors", "abstract", "published_date", "updated_date",
+    "categories", "pdf_url", "volume_path", "in_knowledge_assistant", "ingested_at",
+)
+DEFAULT_PAPER_COLUMNS = (
+    "arxiv_id", "title", "authors", "abstract", "published_date",
+    "categories", "pdf_url", "volume_path",
+)
+
+# PDFs up to this size stay in memory while in transit; larger ones spill to an
+# anonymous temp file owned by the request.
+PDF_SPOOL_MAX_BYTES = 32 * 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+DOWNLOAD_TIMEOUT_SECONDS = 60
+HTTP_POOL_SIZE = 16
+DELETE_MAX_WORKERS = 8
+LIST_PAGE_SIZE = 1000
+# Results per arxiv API request; search_papers pages through larger queries
+ARXIV_PAGE_SIZE = 100
+
+# How stale the local papers mirror may get before sync_mirror queries the
+# warehouse again, and how often a full ID reconcile picks up remote deletes.
+MIRROR_SYNC_SECONDS = 30.0
+MIRROR_RECONCILE_SECONDS = 600.0
+
+
+_ARXIV_VERSION = re.compile(r"v(\d+)$")
+_OLD_STYLE_STEM = re.compile(r"^([a-z-]+(?:\.[A-Z]{2})?)_(\d{7}(?:v\d+)?)$")
 
 
 # =============================================================================
 # Data Classes
 # =============================================================================
 
+class PaperStatus(str, Enum):
+    """Where a candidate paper stands relative to what is already ingested."""
+    NEW = "new"
+    IN_KA = "in_ka"
+    NEWER_VERSION = "newer_version"
+
+
 @dataclass
 class PaperMetadata:
     """Metadata for an arxiv paper."""
@@ -40,23 +127,195 @@ class PaperMetadata:
     volume_path: str | None = None
 
 
+@dataclass(slots=True)
+class ParsedElement:
+    """One ai_parse_document element, keeping only the fields we read.
+
+    ``page`` and ``bbox`` come from the element's first bounding box.
+    """
+    type: str
+    content: str
+    page: int | None = None
+    bbox: tuple[float, ...] | None = None
+    description: str | None = None
+
+    @classmethod
+    def from_raw(cls, elem: dict) -> "ParsedElement":
+        """From an element object in ai_parse_document's JSON output."""
+        boxes = elem.get("bbox") or [{}]
+        coord = boxes[0].get("coord")
+        return cls(
+            type=sys.intern(elem.get("type") or ""),
+            content=elem.get("content") or "",
+            page=boxes[0].get("page_id"),
+            bbox=tuple(coord) if coord else None,
+            description=elem.get("description"),
+        )
+
+
 @dataclass
 class ParsedDocument:
-    """Result from ai_parse_document."""
+    """Result from ai_parse_document.
+
+    ``text`` and ``element_count`` are filled in while the result is decoded,
+    or on the warehouse for a projected parse (see DocumentParser). Projected
+    and element-less parses have an empty ``elements`` list.
+    """
     arxiv_id: str
     page_count: int
-    elements: list[dict]
+    elements: list[ParsedElement]
     has_tables: bool
     has_figures: bool
+    text: str | None = None
+    element_count: int | None = None
 
     @property
     def text_content(self) -> str:
-        """Extract all text content."""
-        texts = []
+        """All text elements joined by blank lines, built once and kept in ``text``."""
+        if self.text is None:
+            self.text = "\n\n".join(self.iter_text())
+        return self.text
+
+    def iter_text(self) -> Iterator[str]:
+        """Content of each text element in order (the whole text if there are no elements)."""
+        if not self.elements:
+            if self.text:
+                yield self.text
+            return
+        for elem in self.elements:
+            if elem.type == "text":
+                yield elem.content
+
+    @cached_property
+    def _by_type(self) -> dict[str, list[ParsedElement]]:
+        by_type: dict[str, list[ParsedElement]] = {}
         for elem in self.elements:
-            if elem.get("type") == "text":
-                texts.append(elem.get("content", ""))
-        return "\n\n".join(texts)
+            by_type.setdefault(elem.type, []).append(elem)
+        return by_type
+
+    def elements_of_type(self, elem_type: str, page: int | None = None) -> list[ParsedElement]:
+        """Elements of one type, in document order, optionally only those on ``page``."""
+        elements = self._by_type.get(elem_type, [])
+        if page is None:
+            return list(elements)
+        return [e for e in elements if e.page == page]
+
+    def tables(self, page: int | None = None) -> list[ParsedElement]:
+        return self.elements_of_type("table", page)
+
+    def figures(self, page: int | None = None) -> list[ParsedElement]:
+        return self.elements_of_type("figure", page)
+
+    def to_record(self) -> dict:
+        """Plain-dict form stored in the ParseCache."""
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_record(cls, record: dict, arxiv_id: str) -> "ParsedDocument":
+        """Rebuild from a ParseCache record, including ones holding raw element dicts."""
+        elements = [
+            ParsedElement(**{**e, "bbox": tuple(e["bbox"]) if e["bbox"] else None})
+            if "page" in e else ParsedElement.from_raw(e)
+            for e in record.get("elements", [])
+        ]
+        return cls(**{**record, "arxiv_id": arxiv_id, "elements": elements})
+
+
+@dataclass
+class StagedPdf:
+    """A PDF uploaded to the staging volume.
+
+    ``parse_path`` and ``parse_sha256`` are what to parse and extract: the PDF
+    itself, or a copy of its first ``truncated_to`` pages when it exceeded the
+    page cap. ``page_count`` is None when it could not be probed.
+    """
+    path: str
+    sha256: str
+    size_bytes: int
+    page_count: int | None = None
+    truncated_to: int | None = None
+    parse_path: str | None = None
+    parse_sha256: str | None = None
+
+    def __post_init__(self):
+        self.parse_path = self.parse_path or self.path
+        self.parse_sha256 = self.parse_sha256 or self.sha256
+
+    @property
+    def estimated_pages(self) -> int:
+        """Pages that will be parsed, guessed from the size if the count is unknown."""
+        if self.truncated_to is not None:
+            return self.truncated_to
+        return PdfProbe(self.size_bytes, self.page_count).estimated_pages
+
+
+@dataclass
+class IngestResult:
+    """Outcome of ingesting a single paper."""
+    paper: PaperMetadata
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class DeleteResult:
+    """Outcome of deleting a single paper."""
+    arxiv_id: str
+    file_missing: bool = False
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class ParseHandle:
+    """An in-flight parse started by DocumentParser.submit_parse."""
+    arxiv_id: str
+    volume_path: str
+    future: StatementFuture
+    sql: SqlGateway
+    projection: bool = False
+    keep_elements: bool = True
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    @property
+    def queue_seconds(self) -> float:
+        return self.future.queue_seconds
+
+    @property
+    def run_seconds(self) -> float:
+        return self.future.run_seconds
+
+    def result(self, timeout: float | None = None) -> "ParsedDocument":
+        """Wait for the parse.
+
+        ``timeout`` only bounds this wait; the statement keeps its deadlines.
+        """
+        response = self.future.result(timeout)
+        if not response.result or not response.result.data_array:
+            raise RuntimeError("No result returned from ai_parse_document")
+        row = response.result.data_array[0]
+        if self.projection:
+            # Inline JSON results carry every value as a string
+            text, page_count, element_count, has_tables, has_figures = row
+            return _to_projected_document({
+                "text": text,
+                "page_count": int(page_count) if page_count is not None else None,
+                "element_count": int(element_count) if element_count is not None else None,
+                "has_tables": has_tables == "true",
+                "has_figures": has_figures == "true",
+            }, self.arxiv_id)
+        return _to_parsed_document(row[0], self.arxiv_id, self.keep_elements)
+
+    def cancel(self) -> None:
+        self.sql.cancel(self.future)
 
 
 @dataclass
@@ -71,6 +330,193 @@ class ExtractedPaper:
     topics: list[str]
 
 
+def split_arxiv_id(arxiv_id: str) -> tuple[str, int | None]:
+    """Split ``2411.15138v2`` into (``2411.15138``, 2); unversioned IDs give None."""
+    match = _ARXIV_VERSION.search(arxiv_id)
+    if not match:
+        return arxiv_id, None
+    return arxiv_id[: match.start()], int(match.group(1))
+
+
+def _file_stem(arxiv_id: str) -> str:
+    """Volume filename stem for a paper (old-style IDs like cs/0112017 contain a slash)."""
+    return arxiv_id.replace("/", "_")
+
+
+def _pdf_filename(arxiv_id: str) -> str:
+    return f"{_file_stem(arxiv_id)}.pdf"
+
+
+def _latest_versions(papers: Iterable[PaperMetadata]) -> dict[str, PaperMetadata]:
+    """Highest version of each paper by base ID; among equal versions the last wins."""
+    latest: dict[str, PaperMetadata] = {}
+    for paper in papers:
+        base, version = split_arxiv_id(paper.arxiv_id)
+        current = latest.get(base)
+        if current is None or (version or 0) >= (split_arxiv_id(current.arxiv_id)[1] or 0):
+            latest[base] = paper
+    return latest
+
+
+def _base_id_sql(column: str) -> str:
+    """SQL for the unversioned form of an arxiv ID column."""
+    return f"regexp_replace({column}, 'v[0-9]+$', '')"
+
+
+def _version_sql(column: str) -> str:
+    """SQL for the version number of an arxiv ID column, 0 when unversioned."""
+    return f"coalesce(try_cast(regexp_extract({column}, 'v([0-9]+)$', 1) AS INT), 0)"
+
+
+def arxiv_id_from_path(volume_path: str) -> str:
+    """Inverse of the volume filename: ``.../hep-th_9901001v1.pdf`` -> ``hep-th/9901001v1``."""
+    stem = volume_path.rsplit("/", 1)[-1].removesuffix(".pdf")
+    return _OLD_STYLE_STEM.sub(r"\1/\2", stem)
+
+
+def _to_metadata(result: arxiv.Result) -> PaperMetadata:
+    return PaperMetadata(
+        arxiv_id=result.entry_id.split("/")[-1],
+        title=result.title,
+        authors=[author.name for author in result.authors],
+        abstract=result.summary,
+        published=result.published.isoformat(),
+        updated=result.updated.isoformat(),
+        categories=result.categories,
+        pdf_url=result.pdf_url,
+    )
+
+
+def _to_parsed_document(
+    raw_result: str, arxiv_id: str, keep_elements: bool = True
+) -> ParsedDocument:
+    """Build a ParsedDocument from ai_parse_document's JSON output.
+
+    Elements are decoded one at a time and text, count and flags are gathered
+    in the same pass. Kept elements are reduced to ParsedElement records; without
+    ``keep_elements`` each one is dropped once seen, so memory beyond the raw
+    string stays bounded by one element.
+    """
+    metadata: dict = {}
+    elements = []
+    texts = []
+    element_count = 0
+    has_tables = has_figures = False
+    for elem in iter_elements(raw_result, metadata):
+        element_count += 1
+        elem_type = elem.get("type")
+        if elem_type == "text":
+            texts.append(elem.get("content") or "")
+        elif elem_type == "table":
+            has_tables = True
+        elif elem_type == "figure":
+            has_figures = True
+        if keep_elements:
+            elements.append(ParsedElement.from_raw(elem))
+
+    return ParsedDocument(
+        arxiv_id=arxiv_id,
+        page_count=metadata.get("page_count", 0),
+        elements=elements,
+        has_tables=has_tables,
+        has_figures=has_figures,
+        text="\n\n".join(texts),
+        element_count=element_count,
+    )
+
+
+def _to_projected_document(row: dict, arxiv_id: str) -> ParsedDocument:
+    """Build an element-less ParsedDocument from a projected parse row."""
+    return ParsedDocument(
+        arxiv_id=arxiv_id,
+        page_count=row["page_count"] or 0,
+        elements=[],
+        has_tables=bool(row["has_tables"]),
+        has_figures=bool(row["has_figures"]),
+        text=row["text"] or "",
+        # size() of a missing element array is -1 or NULL depending on ANSI mode
+        element_count=max(row["element_count"] or 0, 0),
+    )
+
+
+def _project_parse(parse_sql: str, keep: str = "") -> str:
+    """Wrap a query yielding a ``parsed`` VARIANT column so it returns only text,
+    counts and flags, computed on the warehouse instead of shipping every element."""
+    keep = f"{keep}, " if keep else ""
+    return f"""
+    SELECT {keep}
+        array_join(transform(
+            filter(elements, e -> variant_get(e, '$.type', 'STRING') = 'text'),
+            e -> coalesce(variant_get(e, '$.content', 'STRING'), '')
+        ), '\\n\\n') AS text,
+        page_count,
+        size(elements) AS element_count,
+        exists(elements, e -> variant_get(e, '$.type', 'STRING') = 'table') AS has_tables,
+        exists(elements, e -> variant_get(e, '$.type', 'STRING') = 'figure') AS has_figures
+    FROM (
+        SELECT {keep}
+            variant_get(parsed, '$.document.elements', 'ARRAY<VARIANT>') AS elements,
+            variant_get(parsed, '$.metadata.page_count', 'INT') AS page_count
+        FROM ({parse_sql})
+    )
+    """
+
+
+def _spooled_jsonl(rows: Iterable[dict]) -> BinaryIO:
+    """Rows as UTF-8 JSON lines in a spooled temp file, rewound for upload."""
+    spool = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
+    for row in rows:
+        spool.write(json.dumps(row).encode())
+        spool.write(b"\n")
+    spool.seek(0)
+    return spool
+
+
+def _hash_stream(stream: BinaryIO) -> tuple[str, int]:
+    """sha256 and byte size of a stream, read from its current position to the end."""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := stream.read(DOWNLOAD_CHUNK_BYTES):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+# =============================================================================
+# Rate Limiting
+# =============================================================================
+
+class RateLimiter:
+    """Thread-safe token bucket.
+
+    Refills one token every ``interval`` seconds, up to ``burst`` tokens.
+    An interval of zero or less disables limiting.
+    """
+
+    def __init__(self, interval: float, burst: int = 1):
+        self.interval = interval
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available, then consume it."""
+        if self.interval <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._updated
+                self._tokens = min(self.burst, self._tokens + elapsed / self.interval)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.interval
+            time.sleep(wait)
+
+
 # =============================================================================
 # Arxiv Ingestion
 # =============================================================================
@@ -78,9 +524,38 @@ class ExtractedPaper:
 class ArxivIngestion:
     """Handle arxiv paper search, download, and upload to Databricks."""
 
-    def __init__(self, config: DatabricksConfig | None = None):
+    def __init__(
+        self,
+        config: DatabricksConfig | None = None,
+        arxiv_delay_seconds: float = 3.0,
+        pdf_cache: PdfCache | None = None,
+        sql: SqlGateway | None = None,
+        search_cache: SearchCache | None = None,
+        mirror: PapersMirror | None = None,
+        listing_cache: ListingCache | None = None,
+        versions: VersionIndex | None = None,
+    ):
         self.config = config or DEFAULT_CONFIG
         self._client: WorkspaceClient | None = None
+        self.search_cache = search_cache or SEARCH_CACHE
+        self.listing_cache = listing_cache or LISTING_CACHE
+        # Pacing is done by _arxiv_limiter, one place for every arxiv request
+        self._arxiv = arxiv.Client(page_size=ARXIV_PAGE_SIZE, delay_seconds=0)
+        self.sql = sql or SqlGateway.for_config(self.config)
+        self.mirror = mirror or PapersMirror(self.config.mirror_path)
+        self.versions = versions or VersionIndex(self.config.version_index_path)
+        self.pdf_cache = pdf_cache or PdfCache(
+            self.config.pdf_cache_dir, self.config.pdf_cache_mb * 1024 * 1024
+        )
+        # Shared by every arxiv-facing request made through this instance
+        self._arxiv_limiter = RateLimiter(arxiv_delay_seconds)
+        # Keep-alive session reused for all PDF downloads
+        self._http = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE
+        )
+        self._http.mount("https://", adapter)
+        self._http.mount("http://", adapter)
 
     @property
     def client(self) -> WorkspaceClient:
@@ -95,175 +570,716 @@ class ArxivIngestion:
         sort_by: arxiv.SortCriterion = arxiv.SortCriterion.SubmittedDate,
         sort_order: arxiv.SortOrder = arxiv.SortOrder.Descending,
     ) -> list[PaperMetadata]:
-        """Search arxiv for papers matching query."""
-        client = arxiv.Client()
-        search = arxiv.Search(
-            query=query,
-            max_results=max_results,
-            sort_by=sort_by,
-            sort_order=sort_order,
-        )
+        """Search arxiv for papers matching query.
 
-        papers = []
-        for result in client.results(search):
-            paper = PaperMetadata(
-                arxiv_id=result.entry_id.split("/")[-1],
-                title=result.title,
-                authors=[author.name for author in result.authors],
-                abstract=result.summary,
-                published=result.published.isoformat(),
-                updated=result.updated.isoformat(),
-                categories=result.categories,
-                pdf_url=result.pdf_url,
-            )
-            papers.append(paper)
-        return papers
+        Results are served from the process-wide search cache when possible. If a
+        cached query is asked for more results, only the missing tail is fetched.
+        """
+        query = SearchCache.normalize_query(query)
+        key = (query, sort_by.value, sort_order.value)
+        entry, hit = self.search_cache.lookup(key, max_results)
+
+        if not hit:
+            offset = len(entry.results) if entry else 0
+            fetched = []
+            exhausted = False
+            # One API request per page, each behind the shared rate limiter
+            while not exhausted and offset + len(fetched) < max_results:
+                start = offset + len(fetched)
+                size = min(ARXIV_PAGE_SIZE, max_results - start)
+                search = arxiv.Search(
+                    query=query,
+                    max_results=start + size,
+                    sort_by=sort_by,
+                    sort_order=sort_order,
+                )
+                self._arxiv_limiter.acquire()
+                page = [_to_metadata(r) for r in self._arxiv.results(search, offset=start)]
+                fetched.extend(page)
+                exhausted = len(page) < size
+            if entry:
+                # Keep the original timestamp so the TTL still covers the oldest page
+                entry = dataclasses.replace(
+                    entry, results=entry.results + fetched, exhausted=exhausted
+                )
+            else:
+                entry = SearchEntry(results=fetched, exhausted=exhausted)
+            self.search_cache.store(key, entry)
+
+        # Copies, since callers set volume_path on the papers they ingest
+        return [dataclasses.replace(p) for p in entry.results[:max_results]]
 
     def download_and_upload(
         self,
         papers: list[PaperMetadata],
-        delay_seconds: float = 3.0,
-    ) -> list[PaperMetadata]:
-        """Download PDFs from arxiv and upload to UC Volume."""
-        client = arxiv.Client()
-
-        for i, paper in enumerate(papers):
-            # Download PDF
-            search = arxiv.Search(id_list=[paper.arxiv_id])
-            result = next(client.results(search))
-            result.download_pdf(dirpath=".", filename="_temp.pdf")
-
-            # Read and upload
-            temp_path = Path("_temp.pdf")
-            pdf_content = temp_path.read_bytes()
-            temp_path.unlink()
-
-            # Upload to UC Volume
-            filename = f"{paper.arxiv_id.replace('/', '_')}.pdf"
-            volume_file_path = f"{self.config.volume_path}/{filename}"
-
-            self.client.files.upload(
-                file_path=volume_file_path,
-                contents=io.BytesIO(pdf_content),
-                overwrite=True,
-            )
+        delay_seconds: float | None = None,
+        max_workers: int = 1,
+    ) -> list[IngestResult]:
+        """Download PDFs from arxiv, upload to UC Volume, and save metadata.
+
+        Only arxiv requests are paced (one per ``delay_seconds``, defaulting to the
+        instance's limiter); uploads run unthrottled on up to ``max_workers`` threads,
+        and metadata for every uploaded paper is saved in one MERGE at the end.
+        A failure on one paper is recorded on its result instead of aborting the
+        batch. Results are returned in input order.
+
+        Only the highest version of each paper in the batch is ingested; other
+        versions, and papers whose newer version is already in the volume or the
+        papers table, get an error result instead of replacing it.
+        """
+        if delay_seconds is None:
+            limiter = self._arxiv_limiter
+        else:
+            limiter = RateLimiter(delay_seconds)
+
+        latest = _latest_versions(papers)
+        # List the volume once for the whole batch; workers check this snapshot
+        # and add their own uploads to it. Each base ID is uploaded by at most
+        # one worker, so they never touch the same entry.
+        in_volume = self._volume_versions()
+        # Likewise one query for the table, whose row may be newer than any file
+        in_table: dict[str, tuple[int, str]] = {}
+        for arxiv_id in self._table_ids(list(latest.values())):
+            base, version = split_arxiv_id(arxiv_id)
+            if base not in in_table or in_table[base][0] < (version or 0):
+                in_table[base] = (version or 0, arxiv_id)
+
+        def ingest(paper: PaperMetadata) -> IngestResult:
+            base, version = split_arxiv_id(paper.arxiv_id)
+            newer = latest[base]
+            if newer is not paper:
+                error = f"Superseded by {newer.arxiv_id} in this batch"
+                return IngestResult(paper=paper, error=error)
+            newer_id = self._newer_version_in_volume(paper.arxiv_id, in_volume)
+            if not newer_id and base in in_table and in_table[base][0] > (version or 0):
+                newer_id = in_table[base][1]
+            if newer_id:
+                return IngestResult(paper=paper, error=f"{newer_id} is already ingested")
+            try:
+                with self._open_pdf(paper, limiter) as pdf:
+                    paper.volume_path = self._upload_pdf(paper, self.config.volume_path, pdf)
+            except Exception as e:
+                return IngestResult(paper=paper, error=str(e))
+            in_volume.setdefault(base, {})[paper.volume_path] = version or 0
+            return IngestResult(paper=paper)
+
+        try:
+            self.resolve_pdf_urls(list(latest.values()), limiter)
+        except Exception:
+            # Papers still missing a URL will fail individually below
+            pass
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            results = list(pool.map(ingest, papers))
+
+        uploaded = [r for r in results if r.ok]
+        try:
+            self.upsert_papers([r.paper for r in uploaded])
+        except Exception as e:
+            for result in uploaded:
+                result.error = f"Metadata save failed: {e}"
+            return results
+
+        for result in uploaded:
+            self._delete_older_versions(result.paper.arxiv_id, in_volume)
+        return results
+
+    def resolve_pdf_urls(
+        self, papers: list[PaperMetadata], limiter: RateLimiter | None = None
+    ) -> None:
+        """Fill in pdf_url for papers that lack one, with a single arxiv id_list query."""
+        missing = {p.arxiv_id: p for p in papers if not p.pdf_url}
+        if not missing:
+            return
+
+        limiter = limiter or self._arxiv_limiter
+        limiter.acquire()
+        search = arxiv.Search(id_list=list(missing), max_results=len(missing))
+        for result in self._arxiv.results(search):
+            arxiv_id = result.entry_id.split("/")[-1]
+            # id_list entries may be unversioned while results always carry a version
+            paper = missing.get(arxiv_id) or missing.get(split_arxiv_id(arxiv_id)[0])
+            if paper:
+                paper.pdf_url = result.pdf_url
+
+    def fetch_papers(self, arxiv_ids: Sequence[str]) -> list[PaperMetadata]:
+        """Look up metadata for known arxiv IDs with one id_list query.
+
+        IDs arxiv does not recognize are left out of the result.
+        """
+        if not arxiv_ids:
+            return []
+        self._arxiv_limiter.acquire()
+        search = arxiv.Search(id_list=list(arxiv_ids), max_results=len(arxiv_ids))
+        return [_to_metadata(result) for result in self._arxiv.results(search)]
+
+    def _open_pdf(self, paper: PaperMetadata, limiter: RateLimiter | None = None) -> BinaryIO:
+        """Open a paper's PDF, from the local cache if present, else from its pdf_url.
 
-            paper.volume_path = volume_file_path
+        Network downloads are paced by the limiter, reuse this instance's keep-alive
+        session, and are streamed into a per-request spooled buffer before being
+        added to the cache. The returned stream is positioned at the start; the
+        caller is responsible for closing it.
+        """
+        cached = self.pdf_cache.open(paper.arxiv_id)
+        if cached is not None:
+            return cached
+
+        limiter = limiter or self._arxiv_limiter
+        if not paper.pdf_url:
+            self.resolve_pdf_urls([paper], limiter)
+        if not paper.pdf_url:
+            raise RuntimeError(f"No PDF URL found for {paper.arxiv_id}")
+
+        # arxiv reports http:// URLs that redirect to https://; skip the extra hop
+        url = paper.pdf_url.replace("http://", "https://", 1)
+
+        buffer = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
+        try:
+            limiter.acquire()
+            with self._http.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                    buffer.write(chunk)
+            buffer.seek(0)
+            self.pdf_cache.put(paper.arxiv_id, buffer)
+            buffer.seek(0)
+        except Exception:
+            buffer.close()
+            raise
+        return buffer
+
+    def _upload_pdf(self, paper: PaperMetadata, volume_dir: str, contents: BinaryIO) -> str:
+        """Upload a PDF stream into a volume directory. Returns the file path."""
+        file_path = f"{volume_dir}/{_pdf_filename(paper.arxiv_id)}"
+
+        self.client.files.upload(file_path=file_path, contents=contents, overwrite=True)
+        self.listing_cache.record_added(volume_dir, file_path)
+        return file_path
+
+    def list_uploaded_files(self, refresh: bool = False) -> list[str]:
+        """List files in the UC Volume, sorted by path.
+
+        Served from the listing cache when it has a live snapshot; ``refresh``
+        forces a full listing.
+        """
+        volume_path = self.config.volume_path
+        if not refresh:
+            cached = self.listing_cache.get(volume_path)
+            if cached is not None:
+                return cached
+
+        generation = self.listing_cache.generation(volume_path)
+        paths = sorted(self.iter_uploaded_files(volume_path))
+        self.listing_cache.store(volume_path, paths, generation)
+        return paths
+
+    def iter_uploaded_files(
+        self, volume_path: str | None = None, page_size: int = LIST_PAGE_SIZE
+    ) -> Iterator[str]:
+        """Stream file paths in a volume directory, fetching ``page_size`` entries per request."""
+        entries = self.client.files.list_directory_contents(
+            volume_path or self.config.volume_path, page_size=page_size
+        )
+        for entry in entries:
+            yield entry.path
 
-            # Save metadata to Delta table
-            self.save_paper_metadata(paper)
+    def check_existing(self, papers: list[PaperMetadata]) -> dict[str, PaperStatus]:
+        """Classify candidate papers against the papers table and the KA volume.
 
-            # Rate limit
-            if i < len(papers) - 1:
-                time.sleep(delay_seconds)
+        Uses one query over all candidates' base IDs and one volume listing,
+        regardless of how many papers are checked. A candidate is IN_KA if the
+        same or a later version is present, NEWER_VERSION if only an earlier
+        version is, and NEW otherwise.
+        """
+        if not papers:
+            return {}
 
-        return papers
+        # Compare in filename form, since that is all the volume listing gives us
+        known = {_file_stem(arxiv_id) for arxiv_id in self._table_ids(papers)}
+        known.update(
+            path.split("/")[-1].removesuffix(".pdf") for path in self.list_uploaded_files()
+        )
 
-    def list_uploaded_files(self) -> list[str]:
-        """List files in the UC Volume."""
-        files = self.client.files.list_directory_contents(self.config.volume_path)
-        return [f.path for f in files]
+        # base ID -> highest known version (0 for unversioned)
+        latest: dict[str, int] = {}
+        for stem in known:
+            base, version = split_arxiv_id(stem)
+            latest[base] = max(latest.get(base, 0), version or 0)
+
+        statuses = {}
+        for paper in papers:
+            base, version = split_arxiv_id(_file_stem(paper.arxiv_id))
+            if base not in latest:
+                statuses[paper.arxiv_id] = PaperStatus.NEW
+            elif version is not None and version > latest[base]:
+                statuses[paper.arxiv_id] = PaperStatus.NEWER_VERSION
+            else:
+                statuses[paper.arxiv_id] = PaperStatus.IN_KA
+        return statuses
+
+    def _table_ids(self, papers: list[PaperMetadata]) -> list[str]:
+        """arxiv_ids of papers table rows for any version of these papers, in one query."""
+        if not papers:
+            return []
+        bases = sorted({split_arxiv_id(p.arxiv_id)[0] for p in papers})
+        parameters = {f"id_{i}": base for i, base in enumerate(bases)}
+        placeholders = ", ".join(f":{name}" for name in parameters)
+        sql = f"""
+        SELECT arxiv_id FROM {self.config.full_schema}.papers
+        WHERE {_base_id_sql("arxiv_id")} IN ({placeholders})
+        """
+        response = self.sql.execute(sql, parameters)
+        rows = (response.result.data_array or []) if response.result else []
+        return [row[0] for row in rows]
 
     def delete_file(self, volume_path: str) -> None:
         """Delete a file from the UC Volume."""
-        self.client.files.delete(volume_path)
+        directory = volume_path.rpartition("/")[0]
+        try:
+            self.client.files.delete(volume_path)
+        except NotFound:
+            self.listing_cache.record_removed(directory, volume_path)
+            raise
+        self.listing_cache.record_removed(directory, volume_path)
 
     def save_paper_metadata(self, paper: PaperMetadata) -> None:
         """Save paper metadata to the papers Delta table."""
-        title_escaped = paper.title.replace("'", "''")
-        abstract_escaped = paper.abstract.replace("'", "''")
-        escape = lambda s: s.replace("'", "''")
-        authors_sql = ", ".join([f"'{escape(a)}'" for a in paper.authors])
-        categories_sql = ", ".join([f"'{c}'" for c in paper.categories])
-
-        delete_sql = f"DELETE FROM {self.config.full_schema}.papers WHERE arxiv_id = '{paper.arxiv_id}'"
-        insert_sql = f"""
-        INSERT INTO {self.config.full_schema}.papers (
+        self.upsert_papers([paper])
+
+    def upsert_papers(self, papers: list[PaperMetadata]) -> None:
+        """Upsert any number of papers into the papers Delta table in one MERGE."""
+        self.submit_upsert_papers(papers).result()
+
+    def submit_upsert_papers(self, papers: list[PaperMetadata]) -> Future:
+        """Start a paper upsert without waiting for it; see upsert_papers.
+
+        Rows are matched on base arxiv ID, so a new version updates the existing
+        row in place (including its arxiv_id) instead of adding a second one. An
+        older version than the row's is ignored, and of several rows for one
+        paper (tables written before rows were per base ID) all but the latest
+        version are deleted.
+        Values are sent as named parameters rather than inlined literals, so the
+        statement text depends only on the row count.
+        """
+        # MERGE rejects several source rows matching one target row
+        unique = list(_latest_versions(papers).values())
+        if not unique:
+            done = Future()
+            done.set_result(None)
+            return done
+
+        rows = []
+        parameters = {}
+        for i, paper in enumerate(unique):
+            values = {
+                "arxiv_id": paper.arxiv_id,
+                "title": paper.title,
+                "authors": json.dumps(paper.authors),
+                "abstract": paper.abstract,
+                "published": paper.published,
+                "updated": paper.updated,
+                "categories": json.dumps(paper.categories),
+                "pdf_url": paper.pdf_url,
+                "volume_path": paper.volume_path,
+            }
+            rows.append("(" + ", ".join(f":{name}_{i}" for name in values) + ")")
+            parameters.update({f"{name}_{i}": value for name, value in values.items()})
+
+        values_sql = ",\n            ".join(rows)
+        table = f"{self.config.full_schema}.papers"
+        target_version = _version_sql("target.arxiv_id")
+        sql = f"""
+        MERGE INTO {table} AS target
+        USING (
+            SELECT incoming.*, latest.version AS latest_version
+            FROM (
+                SELECT
+                    arxiv_id, title, from_json(authors, 'ARRAY<STRING>') AS authors, abstract,
+                    CAST(published AS TIMESTAMP) AS published_date,
+                    CAST(updated AS TIMESTAMP) AS updated_date,
+                    from_json(categories, 'ARRAY<STRING>') AS categories, pdf_url, volume_path,
+                    {_base_id_sql("arxiv_id")} AS base_id,
+                    {_version_sql("arxiv_id")} AS version
+                FROM VALUES
+                {values_sql}
+                AS v(arxiv_id, title, authors, abstract, published, updated,
+                     categories, pdf_url, volume_path)
+            ) AS incoming
+            LEFT JOIN (
+                SELECT
+                    {_base_id_sql("arxiv_id")} AS base_id,
+                    max({_version_sql("arxiv_id")}) AS version
+                FROM {table}
+                GROUP BY 1
+            ) AS latest ON latest.base_id = incoming.base_id
+        ) AS source
+        ON {_base_id_sql("target.arxiv_id")} = source.base_id
+        -- Legacy rows for earlier versions would otherwise all be renamed to one arxiv_id
+        WHEN MATCHED AND {target_version} < source.latest_version THEN DELETE
+        WHEN MATCHED AND source.version >= {target_version} THEN UPDATE SET
+            arxiv_id = source.arxiv_id, title = source.title, authors = source.authors,
+            abstract = source.abstract, published_date = source.published_date,
+            updated_date = source.updated_date, categories = source.categories,
+            pdf_url = source.pdf_url, volume_path = source.volume_path,
+            in_knowledge_assistant = TRUE,
+            ingested_at = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (
             arxiv_id, title, authors, abstract, published_date, updated_date,
             categories, pdf_url, volume_path, in_knowledge_assistant, ingested_at
         ) VALUES (
-            '{paper.arxiv_id}', '{title_escaped}', ARRAY({authors_sql}), '{abstract_escaped}',
-            TIMESTAMP'{paper.published}', TIMESTAMP'{paper.updated}',
-            ARRAY({categories_sql}), '{paper.pdf_url}', '{paper.volume_path}',
-            TRUE, CURRENT_TIMESTAMP()
+            source.arxiv_id, source.title, source.authors, source.abstract,
+            source.published_date, source.updated_date, source.categories,
+            source.pdf_url, source.volume_path, TRUE, CURRENT_TIMESTAMP()
         )
         """
 
-        self.client.statement_execution.execute_statement(
-            warehouse_id=self.config.warehouse_id, statement=delete_sql, wait_timeout="30s"
-        )
-        self.client.statement_execution.execute_statement(
-            warehouse_id=self.config.warehouse_id, statement=insert_sql, wait_timeout="30s"
-        )
+        future = self.sql.submit(sql, parameters)
 
-    def get_all_papers(self) -> list[dict]:
+        def update_mirror():
+            response = future.result()
+            ingested_at = utc_now_iso()
+            try:
+                # Rows the MERGE ignored as older than the table's are skipped here too
+                self.mirror.upsert_latest(
+                    {
+                        "arxiv_id": p.arxiv_id, "title": p.title, "authors": p.authors,
+                        "abstract": p.abstract, "published_date": p.published,
+                        "categories": p.categories, "pdf_url": p.pdf_url,
+                        "volume_path": p.volume_path, "ingested_at": ingested_at,
+                    }
+                    for p in unique
+                )
+            except Exception as e:
+                # The next sync_mirror catches up from the table
+                logger.warning("Could not update the papers mirror: %s", e)
+            return response
+
+        # Not a done-callback: those run on the gateway's poller thread
+        return run_when_done([future], update_mirror)
+
+    def get_all_papers(self, columns: Sequence[str] | None = None) -> list[dict]:
         """Get all papers from the papers Delta table."""
+        return list(self.iter_papers(columns))
+
+    def iter_papers(
+        self,
+        columns: Sequence[str] | None = None,
+        ingested_since: str | None = None,
+    ) -> Iterator[dict]:
+        """Stream papers from the papers Delta table, newest first.
+
+        Only ``columns`` are selected (defaults to everything but bookkeeping
+        columns); rows are read from Arrow result chunks as they arrive.
+        ``ingested_since`` (an ISO timestamp) limits rows to those written at or
+        after that time.
+        """
+        columns = list(columns or DEFAULT_PAPER_COLUMNS)
+        unknown = set(columns) - set(PAPER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown papers columns: {sorted(unknown)}")
+
+        where = ""
+        parameters = None
+        if ingested_since is not None:
+            where = "WHERE ingested_at >= CAST(:ingested_since AS TIMESTAMP)"
+            parameters = {"ingested_since": ingested_since}
+
         sql = f"""
-        SELECT arxiv_id, title, authors, abstract, published_date, categories, pdf_url, volume_path
-        FROM {self.config.full_schema}.papers ORDER BY published_date DESC
+        SELECT {", ".join(columns)}
+        FROM {self.config.full_schema}.papers {where}
+        ORDER BY published_date DESC
         """
-        response = self.client.statement_execution.execute_statement(
-            warehouse_id=self.config.warehouse_id, statement=sql, wait_timeout="30s"
+        for batch in self.sql.iter_arrow(sql, parameters):
+            yield from batch.to_pylist()
+
+    def sync_mirror(
+        self,
+        max_age_seconds: float = MIRROR_SYNC_SECONDS,
+        reconcile_seconds: float = MIRROR_RECONCILE_SECONDS,
+        force: bool = False,
+    ) -> PapersMirror:
+        """Bring the local papers mirror up to date with the warehouse.
+
+        Does nothing if the last sync is younger than ``max_age_seconds``.
+        Otherwise pulls only rows ingested since the watermark (inclusive, since
+        upserts are idempotent), and every ``reconcile_seconds`` also lists all
+        IDs to drop rows deleted by other writers. ``force`` skips both waits.
+        """
+        if not force and self.mirror.seconds_since("sync") < max_age_seconds:
+            return self.mirror
+
+        self.mirror.upsert(
+            self.iter_papers(columns=MIRROR_COLUMNS, ingested_since=self.mirror.watermark),
+            from_warehouse=True,
         )
-        if not response.result or not response.result.data_array:
-            return []
-        columns = [col.name for col in response.manifest.schema.columns]
-        return [{columns[i]: row[i] for i in range(len(columns))} for row in response.result.data_array]
+        if force or self.mirror.seconds_since("reconcile") >= reconcile_seconds:
+            self.mirror.retain(row["arxiv_id"] for row in self.iter_papers(columns=("arxiv_id",)))
+        return self.mirror
 
     def delete_paper(self, arxiv_id: str) -> None:
         """Delete a paper from both the volume and the papers table."""
-        sql = f"DELETE FROM {self.config.full_schema}.papers WHERE arxiv_id = '{arxiv_id}'"
-        self.client.statement_execution.execute_statement(
-            warehouse_id=self.config.warehouse_id, statement=sql, wait_timeout="30s"
-        )
-        filename = f"{arxiv_id.replace('/', '_')}.pdf"
-        volume_path = f"{self.config.volume_path}/{filename}"
-        self.delete_file(volume_path)
+        result = self.delete_papers([arxiv_id])[0]
+        if not result.ok:
+            raise RuntimeError(result.error)
+
+    def delete_papers(
+        self, arxiv_ids: Sequence[str], max_workers: int = DELETE_MAX_WORKERS
+    ) -> list[DeleteResult]:
+        """Delete papers from the papers table and the volume.
+
+        Rows go in one DELETE statement; if it fails, nothing is touched and the
+        error is raised. Files are then deleted on up to ``max_workers`` threads.
+        A file that is already gone is not an error (``file_missing`` is set);
+        any other file failure is recorded on that paper's result. Results are
+        returned in input order, one per distinct ID.
+        """
+        ids = list(dict.fromkeys(arxiv_ids))
+        if not ids:
+            return []
 
-    def download_to_staging(self, paper: PaperMetadata) -> tuple[str, bytes]:
+        self.delete_paper_rows(ids)
+
+        def delete(arxiv_id: str) -> DeleteResult:
+            try:
+                self.delete_file(f"{self.config.volume_path}/{_pdf_filename(arxiv_id)}")
+            except NotFound:
+                return DeleteResult(arxiv_id=arxiv_id, file_missing=True)
+            except Exception as e:
+                return DeleteResult(arxiv_id=arxiv_id, error=str(e))
+            return DeleteResult(arxiv_id=arxiv_id)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ids)))) as pool:
+            return list(pool.map(delete, ids))
+
+    def _volume_versions(self, paths: Iterable[str] | None = None) -> dict[str, dict[str, int]]:
+        """KA volume files grouped by paper: base ID -> {path: version (0 if unversioned)}.
+
+        Groups ``paths`` if given, else the (cached) volume listing.
+        """
+        if paths is None:
+            paths = self.list_uploaded_files()
+        versions: dict[str, dict[str, int]] = {}
+        for path in paths:
+            base, version = split_arxiv_id(arxiv_id_from_path(path))
+            versions.setdefault(base, {})[path] = version or 0
+        return versions
+
+    def _newer_version_in_volume(
+        self, arxiv_id: str, in_volume: dict[str, dict[str, int]] | None = None
+    ) -> str | None:
+        """ID of a later version of this paper already in the KA volume, if any.
+
+        ``in_volume`` is a _volume_versions snapshot to check instead of listing.
+        """
+        base, version = split_arxiv_id(arxiv_id)
+        if in_volume is None:
+            in_volume = self._volume_versions()
+        newer = {p: v for p, v in in_volume.get(base, {}).items() if v > (version or 0)}
+        return arxiv_id_from_path(max(newer, key=newer.get)) if newer else None
+
+    def _delete_older_versions(
+        self, arxiv_id: str, in_volume: dict[str, dict[str, int]] | None = None
+    ) -> None:
+        """Remove KA volume files for earlier versions, once the paper's row points at this one.
+
+        ``in_volume`` is a _volume_versions snapshot to use instead of listing;
+        deleted files are dropped from it.
+        """
+        base, version = split_arxiv_id(arxiv_id)
+        if in_volume is None:
+            in_volume = self._volume_versions()
+        versions = in_volume.get(base, {})
+        for path, other in list(versions.items()):
+            if other < (version or 0):
+                try:
+                    self.delete_file(path)
+                except NotFound:
+                    pass
+                versions.pop(path, None)
+
+    def delete_paper_rows(self, arxiv_ids: Sequence[str]) -> None:
+        """Delete rows from the papers table in one statement, leaving volume files alone."""
+        if not arxiv_ids:
+            return
+        parameters = {f"id_{i}": arxiv_id for i, arxiv_id in enumerate(arxiv_ids)}
+        placeholders = ", ".join(f":{name}" for name in parameters)
+        sql = f"DELETE FROM {self.config.full_schema}.papers WHERE arxiv_id IN ({placeholders})"
+        self.sql.execute(sql, parameters)
+        self.mirror.delete(arxiv_ids)
+
+    def download_to_staging(
+        self, paper: PaperMetadata, max_pages: int | None = None
+    ) -> StagedPdf:
         """Download PDF from arxiv and upload to staging volume.
 
-        Returns (staging_path, pdf_bytes). Does NOT save metadata to papers table.
-        PDF bytes are returned so they can be reused for promote_to_ka without re-downloading.
+        Does NOT save metadata to papers table. The returned StagedPdf carries the
+        staging path, content hash and page count; promote_to_ka copies from
+        staging, so callers do not need to hold on to the PDF bytes.
+        The version and hash are recorded in the version index.
+
+        With ``max_pages``, a PDF with more pages also gets a copy of just its
+        first ``max_pages`` staged, which is what gets parsed. The full PDF is
+        still the one promoted to the KA volume.
         """
-        client = arxiv.Client()
-        search = arxiv.Search(id_list=[paper.arxiv_id])
-        result = next(client.results(search))
-        result.download_pdf(dirpath=".", filename="_temp.pdf")
-
-        temp_path = Path("_temp.pdf")
-        pdf_content = temp_path.read_bytes()
-        temp_path.unlink()
-
-        filename = f"{paper.arxiv_id.replace('/', '_')}.pdf"
-        staging_path = f"{self.config.staging_volume_path}/{filename}"
-
-        self.client.files.upload(
-            file_path=staging_path,
-            contents=io.BytesIO(pdf_content),
-            overwrite=True,
+        truncated_to = parse_path = parse_sha256 = None
+        with self._open_pdf(paper) as pdf:
+            sha256, size = _hash_stream(pdf)
+            pdf.seek(0)
+            page_count = probe_pdf(pdf).page_count
+            staging_path = self._upload_pdf(paper, self.config.staging_volume_path, pdf)
+            if max_pages and page_count and page_count > max_pages:
+                pdf.seek(0)
+                with first_pages(pdf, max_pages) as capped:
+                    parse_sha256, _ = _hash_stream(capped)
+                    capped.seek(0)
+                    parse_path = self._upload_pdf(
+                        paper,
+                        f"{self.config.staging_volume_path}/{TRUNCATED_STAGING_DIR}",
+                        capped,
+                    )
+                truncated_to = max_pages
+
+        base, version = split_arxiv_id(paper.arxiv_id)
+        self.versions.record(VersionRecord(
+            arxiv_id=paper.arxiv_id, base_id=base, version=version or 0,
+            sha256=sha256, size_bytes=size,
+        ))
+        return StagedPdf(
+            path=staging_path,
+            sha256=sha256,
+            size_bytes=size,
+            page_count=page_count,
+            truncated_to=truncated_to,
+            parse_path=parse_path,
+            parse_sha256=parse_sha256,
         )
 
-        return staging_path, pdf_content
+    def reusable_extraction(self, sha256: str) -> ExtractedPaper | None:
+        """KIE result already produced for identical PDF bytes, if any.
 
-    def promote_to_ka(self, paper: PaperMetadata, pdf_content: bytes) -> None:
-        """Upload PDF to KA volume and save metadata.
+        Lets a new version whose PDF did not change skip extraction; its parse is
+        reused through DocumentParser's parse cache.
+        """
+        extracted = self.versions.load_extraction(sha256)
+        return ExtractedPaper(**extracted) if extracted is not None else None
+
+    def save_extraction(self, sha256: str, extracted: ExtractedPaper) -> None:
+        self.versions.save_extraction(sha256, extracted)
+
+    def promote_to_ka(self, paper: PaperMetadata, staging_path: str | None = None) -> None:
+        """Copy a staged PDF into the KA volume and save metadata.
 
         This is called when user explicitly adds a paper to the Knowledge Assistant.
-        Uses pdf_content passed from download_to_staging to avoid re-downloading.
+        ``staging_path`` defaults to where download_to_staging puts the paper.
+        Promoting a new version replaces the earlier version's row and file;
+        promoting an older version than the one in the KA raises ValueError.
         """
-        filename = f"{paper.arxiv_id.replace('/', '_')}.pdf"
-        ka_path = f"{self.config.volume_path}/{filename}"
+        newer = self._newer_version_in_volume(paper.arxiv_id)
+        if newer:
+            raise ValueError(f"{newer} is already in the Knowledge Assistant")
+        paper.volume_path = self._promote_file(paper, staging_path)
+        self.save_paper_metadata(paper)
+        self._delete_older_versions(paper.arxiv_id)
 
-        self.client.files.upload(
-            file_path=ka_path,
-            contents=io.BytesIO(pdf_content),
-            overwrite=True,
-        )
+    def _promote_file(self, paper: PaperMetadata, staging_path: str | None = None) -> str:
+        """Copy a paper's PDF from the staging volume to the KA volume.
+
+        The Files API has no server-side copy, so the PDF is streamed from the local
+        cache when present, otherwise straight from the staging volume into the
+        upload, without being buffered whole in memory.
+        """
+        cached = self.pdf_cache.open(paper.arxiv_id)
+        if cached is not None:
+            with cached:
+                return self._upload_pdf(paper, self.config.volume_path, cached)
+
+        if staging_path is None:
+            staging_path = f"{self.config.staging_volume_path}/{_pdf_filename(paper.arxiv_id)}"
+        download = self.client.files.download(staging_path)
+        with download.contents as stream:
+            return self._upload_pdf(paper, self.config.volume_path, stream)
 
-        # Update paper with KA volume path and save metadata
-        paper.volume_path = ka_path
-        self.save_paper_metadata(paper)
+
+class PaperMetadataBuffer:
+    """Accumulate paper metadata and upsert it to the papers table in batches.
+
+    A flush happens when ``max_rows`` papers are pending, or ``max_age_seconds``
+    after the oldest pending paper arrived (on a timer, so a lone paper is not
+    held until exit). Papers stay pending until their upsert succeeds; a failed
+    timed flush is logged and retried after another ``max_age_seconds``.
+    Use as a context manager to flush whatever is left on exit.
+    """
+
+    def __init__(
+        self,
+        ingestion: ArxivIngestion,
+        max_rows: int = 200,
+        max_age_seconds: float = 30.0,
+    ):
+        self.ingestion = ingestion
+        self.max_rows = max_rows
+        self.max_age_seconds = max_age_seconds
+        # (time added, paper), oldest first
+        self._pending: list[tuple[float, PaperMetadata]] = []
+        self._lock = threading.Lock()
+        # One upsert at a time, so a batch is never written twice
+        self._flush_lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+
+    def add(self, paper: PaperMetadata) -> None:
+        """Queue a paper, flushing if the count threshold is reached."""
+        with self._lock:
+            self._pending.append((time.monotonic(), paper))
+            due = len(self._pending) >= self.max_rows
+            if not due:
+                self._schedule(self._pending[0][0] + self.max_age_seconds)
+        if due:
+            self.flush()
+
+    def _schedule(self, at: float) -> None:
+        """Start the flush timer if it is not running. Call with ``_lock`` held."""
+        if self._timer is None:
+            self._timer = threading.Timer(max(0.0, at - time.monotonic()), self._flush_on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("Timed metadata flush failed, will retry: %s", e)
+
+    def flush(self) -> None:
+        """Upsert all pending papers in a single statement."""
+        with self._flush_lock:
+            with self._lock:
+                batch = [paper for _, paper in self._pending]
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not batch:
+                return
+            try:
+                self.ingestion.upsert_papers(batch)
+            except Exception:
+                with self._lock:
+                    # The batch stays pending; retry it even if nothing else arrives
+                    self._schedule(time.monotonic() + self.max_age_seconds)
+                raise
+            with self._lock:
+                # Papers added during the upsert were appended after the batch
+                del self._pending[: len(batch)]
+                if self._pending:
+                    self._schedule(self._pending[0][0] + self.max_age_seconds)
+
+    def __enter__(self) -> "PaperMetadataBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.flush()
 
 
 # =============================================================================
@@ -273,9 +1289,28 @@ class ArxivIngestion:
 class DocumentParser:
     """Parse documents using ai_parse_document SQL function."""
 
-    def __init__(self, config: DatabricksConfig | None = None):
+    def __init__(
+        self,
+        config: DatabricksConfig | None = None,
+        sql: SqlGateway | None = None,
+        parse_cache: ParseCache | None = None,
+    ):
         self.config = config or DEFAULT_CONFIG
         self._client: WorkspaceClient | None = None
+        self.sql = sql or SqlGateway.for_config(self.config)
+        cache_options = dict(
+            sql=self.sql,
+            table=f"{self.config.full_schema}.parse_cache",
+            staging_dir=f"{self.config.staging_volume_path}/{PARSE_CACHE_STAGING_DIR}",
+            max_bytes=self.config.parse_cache_mb * 1024 * 1024,
+        )
+        self.parse_cache = parse_cache or ParseCache(
+            self.config.parse_cache_dir, PARSER_VERSION, **cache_options
+        )
+        # Projected parses share the table under their own version key
+        self.text_cache = ParseCache(
+            self.config.parse_cache_dir, f"{PARSER_VERSION}-text", **cache_options
+        )
 
     @property
     def client(self) -> WorkspaceClient:
@@ -283,66 +1318,261 @@ class DocumentParser:
             self._client = WorkspaceClient(profile=self.config.profile)
         return self._client
 
-    def parse_document(self, volume_path: str, arxiv_id: str) -> ParsedDocument:
-        """Parse a PDF using ai_parse_document."""
-        sql = f"SELECT ai_parse_document(content) as parsed FROM read_files('{volume_path}')"
+    def _cache(self, with_elements: bool) -> ParseCache:
+        return self.parse_cache if with_elements else self.text_cache
 
-        response = self.client.statement_execution.execute_statement(
-            warehouse_id=self.config.warehouse_id, statement=sql, wait_timeout="50s"
+    def parse_document(
+        self,
+        volume_path: str,
+        arxiv_id: str,
+        content_sha256: str | None = None,
+        projection: bool = False,
+        keep_elements: bool = True,
+    ) -> ParsedDocument:
+        """Parse a PDF using ai_parse_document.
+
+        With ``content_sha256`` (e.g. from StagedPdf) the parse cache is checked
+        first and filled afterwards, so the same bytes are only parsed once.
+        With ``projection`` only text, page count, element count and table/figure
+        flags are computed on the warehouse and returned; ``elements`` is empty.
+        Without ``keep_elements`` the full result is fetched but elements are
+        discarded while it is decoded, giving the same result client-side.
+        """
+        cache = self._cache(keep_elements and not projection)
+        if content_sha256:
+            cached = cache.get(content_sha256)
+            if cached is not None:
+                return ParsedDocument.from_record(cached, arxiv_id)
+
+        doc = self.submit_parse(
+            volume_path, arxiv_id, projection=projection, keep_elements=keep_elements
+        ).result()
+        if content_sha256:
+            cache.put(content_sha256, doc.to_record())
+        return doc
+
+    def submit_parse(
+        self,
+        volume_path: str,
+        arxiv_id: str,
+        run_timeout: float | None = PARSE_TIMEOUT_SECONDS,
+        deadline: float | None = PARSE_DEADLINE_SECONDS,
+        projection: bool = False,
+        keep_elements: bool = True,
+    ) -> ParseHandle:
+        """Start parsing a PDF and return a handle without waiting.
+
+        The shared gateway polls every in-flight parse from one thread, so any
+        number can run at once. ``run_timeout`` limits time spent running, not
+        queued; ``deadline`` limits the total. Missing either cancels the
+        statement and fails the handle with StatementTimeoutError.
+        """
+        sql = "SELECT ai_parse_document(content) AS parsed FROM read_files(:path)"
+        if projection:
+            sql = _project_parse(sql)
+        future = self.sql.submit(
+            sql, {"path": volume_path}, timeout=deadline, run_timeout=run_timeout
         )
-
-        # Poll for completion (parsing can take 1-2 minutes)
-        max_polls = 24
-        poll_count = 0
-        while response.status.state in (StatementState.PENDING, StatementState.RUNNING):
-            if poll_count >= max_polls:
-                raise RuntimeError(f"Parse timed out after {50 + poll_count * 5}s")
-            time.sleep(5)
-            response = self.client.statement_execution.get_statement(response.statement_id)
-            poll_count += 1
-
-        if response.status.state == StatementState.FAILED:
-            raise RuntimeError(f"Parse failed: {response.status.error}")
-        if response.status.state != StatementState.SUCCEEDED:
-            raise RuntimeError(f"Unexpected state: {response.status.state}")
-        if not response.result or not response.result.data_array:
-            raise RuntimeError("No result returned from ai_parse_document")
-
-        raw_result = response.result.data_array[0][0]
-        parsed_data = json.loads(raw_result)
-        document = parsed_data.get("document", {})
-        elements = document.get("elements", [])
-        metadata = parsed_data.get("metadata", {})
-
-        return ParsedDocument(
+        return ParseHandle(
             arxiv_id=arxiv_id,
-            page_count=metadata.get("page_count", 0),
-            elements=elements,
-            has_tables=any(e.get("type") == "table" for e in elements),
-            has_figures=any(e.get("type") == "figure" for e in elements),
+            volume_path=volume_path,
+            future=future,
+            sql=self.sql,
+            projection=projection,
+            keep_elements=keep_elements,
         )
 
+    def parse_documents(
+        self,
+        volume_paths: Sequence[str],
+        timeout: float = BATCH_PARSE_TIMEOUT_SECONDS,
+        content_sha256: dict[str, str] | None = None,
+        projection: bool = False,
+        keep_elements: bool = True,
+    ) -> dict[str, ParsedDocument]:
+        """Parse many PDFs with a single ai_parse_document statement.
+
+        Files are selected with one read_files per directory, filtered by a
+        ``{a.pdf,b.pdf}`` glob, so the warehouse parallelizes across files.
+        Returns documents keyed by the given paths; a path missing from the
+        result was not found. Results are streamed as Arrow chunks, since a
+        batch of parses can exceed the inline result limit.
+        Paths with a hash in ``content_sha256`` are served from the parse cache
+        when possible and only the rest are sent to the warehouse.
+        ``projection`` and ``keep_elements`` work as in parse_document.
+        """
+        content_sha256 = content_sha256 or {}
+        cache = self._cache(keep_elements and not projection)
+        documents = {}
+        cached = cache.get_many(
+            [content_sha256[p] for p in volume_paths if p in content_sha256]
+        )
+        for path in volume_paths:
+            record = cached.get(content_sha256.get(path))
+            if record is not None:
+                documents[path] = ParsedDocument.from_record(record, arxiv_id_from_path(path))
+
+        by_directory: dict[str, dict[str, str]] = {}
+        for path in dict.fromkeys(p for p in volume_paths if p not in documents):
+            directory, _, filename = path.rpartition("/")
+            by_directory.setdefault(directory, {})[filename] = path
+        if not by_directory:
+            return documents
+
+        selects = []
+        parameters = {}
+        for i, (directory, files) in enumerate(by_directory.items()):
+            parameters[f"dir_{i}"] = directory
+            parameters[f"glob_{i}"] = "{" + ",".join(files) + "}"
+            selects.append(
+                f"SELECT path, ai_parse_document(content) AS parsed "
+                f"FROM read_files(:dir_{i}, format => 'binaryFile', pathGlobFilter => :glob_{i})"
+            )
+        sql = "\nUNION ALL\n".join(selects)
+        if projection:
+            sql = _project_parse(sql, keep="path")
+        else:
+            sql = f"SELECT path, to_json(parsed) AS parsed FROM ({sql})"
+
+        for batch in self.sql.iter_arrow(sql, parameters, timeout=timeout):
+            for row in batch.to_pylist():
+                # read_files reports paths as dbfs:/Volumes/...
+                directory, _, filename = row["path"].removeprefix("dbfs:").rpartition("/")
+                path = by_directory.get(directory, {}).get(filename)
+                if path is not None:
+                    arxiv_id = arxiv_id_from_path(path)
+                    if projection:
+                        doc = _to_projected_document(row, arxiv_id)
+                    else:
+                        doc = _to_parsed_document(row["parsed"], arxiv_id, keep_elements)
+                    documents[path] = doc
+                    if path in content_sha256:
+                        cache.put(content_sha256[path], doc.to_record())
+        return documents
+
     def save_parsed_document(self, doc: ParsedDocument) -> None:
-        """Save parsed document to the parsed_documents table."""
-        content_escaped = doc.text_content.replace("'", "''")
+        """Save a parsed document to the parsed_documents and parsed_elements tables."""
+        self.save_parsed_documents([doc])
+
+    def save_parsed_documents(self, docs: Sequence[ParsedDocument]) -> None:
+        self.submit_parsed_documents(docs).result()
 
-        delete_sql = f"DELETE FROM {self.config.full_schema}.parsed_documents WHERE arxiv_id = '{doc.arxiv_id}'"
-        insert_sql = f"""
-        INSERT INTO {self.config.full_schema}.parsed_documents (
+    def submit_parsed_document(self, doc: ParsedDocument) -> Future:
+        """Start saving a parsed document without waiting for it."""
+        return self.submit_parsed_documents([doc])
+
+    def submit_parsed_documents(self, docs: Sequence[ParsedDocument]) -> Future:
+        """Start saving parsed documents in bulk without waiting for it.
+
+        Rows are written as JSONL files in the staging volume and loaded with
+        one MERGE per table, so statement size does not grow with the text.
+        parsed_documents gets one row per paper; parsed_elements one row per
+        element with its page and type, replacing the paper's previous
+        elements. Element-less (projected) parses leave parsed_elements alone.
+        The staged files are removed once both statements finish.
+        """
+        # MERGE rejects several source rows matching one target row; last one wins
+        unique = list({doc.arxiv_id: doc for doc in docs}.values())
+        if not unique:
+            done = Future()
+            done.set_result(None)
+            return done
+
+        staging_dir = f"{self.config.staging_volume_path}/{PARSED_STAGING_DIR}"
+        batch = uuid.uuid4().hex
+        documents_path = f"{staging_dir}/{batch}-documents.jsonl"
+        elements_path = f"{staging_dir}/{batch}-elements.jsonl"
+        with_elements = [doc for doc in unique if doc.elements]
+
+        with _spooled_jsonl(
+            {
+                "arxiv_id": doc.arxiv_id,
+                "parsed_content": doc.text_content,
+                "page_count": doc.page_count,
+                "element_count": (
+                    doc.element_count if doc.element_count is not None else len(doc.elements)
+                ),
+                "has_tables": doc.has_tables,
+                "has_figures": doc.has_figures,
+            }
+            for doc in unique
+        ) as contents:
+            self.client.files.upload(file_path=documents_path, contents=contents, overwrite=True)
+        staged = [documents_path]
+        documents_sql = f"""
+        MERGE INTO {self.config.full_schema}.parsed_documents AS target
+        USING (
+            SELECT * FROM read_files(
+                :path, format => 'json', schema => '{_PARSED_DOCUMENT_SCHEMA}'
+            )
+        ) AS source
+        ON target.arxiv_id = source.arxiv_id
+        WHEN MATCHED THEN UPDATE SET
+            parsed_content = source.parsed_content, page_count = source.page_count,
+            element_count = source.element_count, has_tables = source.has_tables,
+            has_figures = source.has_figures, parsed_at = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (
             arxiv_id, parsed_content, page_count, element_count,
             has_tables, has_figures, parsed_at
         ) VALUES (
-            '{doc.arxiv_id}', '{content_escaped}', {doc.page_count}, {len(doc.elements)},
-            {str(doc.has_tables).upper()}, {str(doc.has_figures).upper()}, CURRENT_TIMESTAMP()
+            source.arxiv_id, source.parsed_content, source.page_count, source.element_count,
+            source.has_tables, source.has_figures, CURRENT_TIMESTAMP()
         )
         """
+        futures = [self.sql.submit(documents_sql, {"path": documents_path})]
 
-        self.client.statement_execution.execute_statement(
-            warehouse_id=self.config.warehouse_id, statement=delete_sql, wait_timeout="30s"
-        )
-        self.client.statement_execution.execute_statement(
-            warehouse_id=self.config.warehouse_id, statement=insert_sql, wait_timeout="30s"
-        )
+        if with_elements:
+            with _spooled_jsonl(
+                {
+                    "arxiv_id": doc.arxiv_id,
+                    "element_index": i,
+                    "type": elem.type,
+                    "page": elem.page,
+                    "content": elem.content,
+                    "description": elem.description,
+                    "bbox": elem.bbox,
+                }
+                for doc in with_elements
+                for i, elem in enumerate(doc.elements)
+            ) as contents:
+                self.client.files.upload(file_path=elements_path, contents=contents, overwrite=True)
+            staged.append(elements_path)
+            ids = {f"id_{i}": doc.arxiv_id for i, doc in enumerate(with_elements)}
+            id_list = ", ".join(f":{name}" for name in ids)
+            elements_sql = f"""
+            MERGE INTO {self.config.full_schema}.parsed_elements AS target
+            USING (
+                SELECT * FROM read_files(
+                    :path, format => 'json', schema => '{_PARSED_ELEMENT_SCHEMA}'
+                )
+            ) AS source
+            ON target.arxiv_id = source.arxiv_id AND target.element_index = source.element_index
+            WHEN MATCHED THEN UPDATE SET
+                type = source.type, page = source.page, content = source.content,
+                description = source.description, bbox = source.bbox,
+                parsed_at = CURRENT_TIMESTAMP()
+            WHEN NOT MATCHED THEN INSERT (
+                arxiv_id, element_index, type, page, content, description, bbox, parsed_at
+            ) VALUES (
+                source.arxiv_id, source.element_index, source.type, source.page,
+                source.content, source.description, source.bbox, CURRENT_TIMESTAMP()
+            )
+            -- Elements past the end of a re-parsed paper's new element list
+            WHEN NOT MATCHED BY SOURCE AND target.arxiv_id IN ({id_list}) THEN DELETE
+            """
+            futures.append(self.sql.submit(elements_sql, {"path": elements_path, **ids}))
+
+        def finish() -> None:
+            for path in staged:
+                try:
+                    self.client.files.delete(path)
+                except Exception:
+                    pass  # Leftover staging files are harmless
+            for future in futures:
+                future.result()
+
+        # File deletes are HTTP calls, so not in a callback on the gateway's poller thread
+        return run_when_done(futures, finish)
 
 
 # =============================================================================
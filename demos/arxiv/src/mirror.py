@@ -0,0 +1,205 @@
+"""
+Local SQLite mirror of the papers Delta table.
+
+The KA manager reads from this mirror instead of querying the warehouse on
+every Streamlit rerun. ArxivIngestion keeps it current: its own writes and
+deletes are applied immediately, and sync_mirror pulls rows from other writers
+incrementally using an ingested_at watermark.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable, Sequence
+
+MIRROR_COLUMNS = (
+    "arxiv_id", "title", "authors", "abstract", "published_date",
+    "categories", "pdf_url", "volume_path", "ingested_at",
+)
+_JSON_COLUMNS = ("authors", "categories")
+# Rows written per lock hold when upserting a stream
+UPSERT_BATCH_ROWS = 500
+_VERSION = re.compile(r"v(\d+)$")
+
+
+def _split_version(arxiv_id: str) -> tuple[str, int]:
+    """(base ID, version), with 0 for an unversioned ID."""
+    match = _VERSION.search(arxiv_id)
+    if match is None:
+        return arxiv_id, 0
+    return arxiv_id[: match.start()], int(match.group(1))
+
+
+def _to_sqlite(column: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if column in _JSON_COLUMNS:
+        return json.dumps(list(value))
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class PapersMirror:
+    """Read-through SQLite copy of the papers table."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = ", ".join(
+                f"{c} TEXT PRIMARY KEY" if c == "arxiv_id" else f"{c} TEXT"
+                for c in MIRROR_COLUMNS
+            )
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS papers ({columns});
+                CREATE INDEX IF NOT EXISTS papers_published ON papers (published_date DESC);
+                CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _get_state(self, key: str) -> str | None:
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    @property
+    def watermark(self) -> str | None:
+        """Latest warehouse ingested_at seen by a sync, as an ISO timestamp."""
+        with self._lock:
+            return self._get_state("watermark")
+
+    def seconds_since(self, event: str) -> float:
+        """Seconds since the last 'sync' or 'reconcile', or infinity if never."""
+        with self._lock:
+            value = self._get_state(f"last_{event}")
+        return time.time() - float(value) if value else float("inf")
+
+    def upsert(self, rows: Iterable[dict], from_warehouse: bool = False) -> int:
+        """Insert or replace rows keyed by arxiv_id. Returns the number written.
+
+        Rows from the warehouse advance the watermark; local writes do not, so a
+        later sync still picks up the authoritative server-side ingested_at.
+        ``rows`` may be a lazy warehouse stream: it is consumed in batches
+        outside the lock, so a slow statement never blocks other mirror users.
+        The watermark only moves once every row is written.
+        """
+        placeholders = ", ".join("?" for _ in MIRROR_COLUMNS)
+        sql = f"INSERT OR REPLACE INTO papers ({', '.join(MIRROR_COLUMNS)}) VALUES ({placeholders})"
+        count = 0
+        newest = None
+        batch = []
+        for row in rows:
+            values = [_to_sqlite(c, row.get(c)) for c in MIRROR_COLUMNS]
+            batch.append(values)
+            ingested_at = values[MIRROR_COLUMNS.index("ingested_at")]
+            if from_warehouse and ingested_at and (newest is None or ingested_at > newest):
+                newest = ingested_at
+            if len(batch) >= UPSERT_BATCH_ROWS:
+                with self._lock, self.conn:
+                    self.conn.executemany(sql, batch)
+                count += len(batch)
+                batch = []
+        with self._lock, self.conn:
+            self.conn.executemany(sql, batch)
+            count += len(batch)
+            if newest:
+                current = self._get_state("watermark")
+                if current is None or newest > current:
+                    self._set_state("watermark", newest)
+            if from_warehouse:
+                self._set_state("last_sync", str(time.time()))
+        return count
+
+    def delete(self, arxiv_ids: Iterable[str]) -> None:
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM papers WHERE arxiv_id = ?", [(i,) for i in arxiv_ids]
+            )
+
+    def upsert_latest(self, rows: Iterable[dict]) -> int:
+        """Write locally saved papers the way the papers MERGE applies them.
+
+        A row replaces every other version of its paper, unless the mirror
+        already holds a later version, in which case the row is skipped. The
+        check and the write happen under one lock hold, so concurrent writers
+        cannot downgrade each other. Returns the number of rows written.
+        """
+        placeholders = ", ".join("?" for _ in MIRROR_COLUMNS)
+        sql = f"INSERT OR REPLACE INTO papers ({', '.join(MIRROR_COLUMNS)}) VALUES ({placeholders})"
+        rows = list(rows)
+        count = 0
+        with self._lock, self.conn:
+            for row in rows:
+                arxiv_id = row["arxiv_id"]
+                base_id, version = _split_version(arxiv_id)
+                versions = (base_id, f"{base_id}v[0-9]*")
+                held = self.conn.execute(
+                    "SELECT arxiv_id FROM papers WHERE arxiv_id = ? OR arxiv_id GLOB ?", versions
+                ).fetchall()
+                if any(_split_version(h["arxiv_id"])[1] > version for h in held):
+                    continue
+                self.conn.execute(
+                    "DELETE FROM papers WHERE arxiv_id != ? AND (arxiv_id = ? OR arxiv_id GLOB ?)",
+                    (arxiv_id, *versions),
+                )
+                self.conn.execute(sql, [_to_sqlite(c, row.get(c)) for c in MIRROR_COLUMNS])
+                count += 1
+        return count
+
+    def retain(self, arxiv_ids: Iterable[str]) -> int:
+        """Delete every row whose ID is not in ``arxiv_ids``. Returns rows removed.
+
+        ``arxiv_ids`` is read in full before the lock is taken.
+        """
+        keep = [(i,) for i in arxiv_ids]
+        with self._lock, self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (arxiv_id TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM keep")
+            self.conn.executemany("INSERT OR IGNORE INTO keep (arxiv_id) VALUES (?)", keep)
+            removed = self.conn.execute(
+                "DELETE FROM papers WHERE arxiv_id NOT IN (SELECT arxiv_id FROM keep)"
+            ).rowcount
+            self._set_state("last_reconcile", str(time.time()))
+        return removed
+
+    def list_papers(self, columns: Sequence[str] | None = None) -> list[dict]:
+        """All mirrored papers, newest first."""
+        columns = list(columns or MIRROR_COLUMNS)
+        unknown = set(columns) - set(MIRROR_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown mirror columns: {sorted(unknown)}")
+
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(columns)} FROM papers ORDER BY published_date DESC"
+            ).fetchall()
+        papers = []
+        for row in rows:
+            paper = dict(row)
+            for column in _JSON_COLUMNS:
+                if paper.get(column) is not None:
+                    paper[column] = json.loads(paper[column])
+            papers.append(paper)
+        return papers
+
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
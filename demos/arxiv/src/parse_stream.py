@@ -0,0 +1,99 @@
+"""
+Incremental decoding of ai_parse_document JSON output.
+
+A parse result looks like ``{"document": {"pages": [...], "elements": [...]},
+"metadata": {...}, ...}`` and for long papers the element list dominates it.
+iter_elements walks the raw text with JSONDecoder.raw_decode and yields one
+element at a time, so the decoded form of the whole document never exists at
+once. Values outside document.elements are small and decoded whole.
+"""
+
+import json
+import re
+import sys
+from typing import Any, Callable, Generator, Iterator
+
+# json.loads shares one key memo across a whole document; decoding element by
+# element loses it, so intern keys to keep repeated ones ("type", "bbox", ...)
+# from being stored once per element.
+_DECODER = json.JSONDecoder(object_pairs_hook=lambda pairs: {sys.intern(k): v for k, v in pairs})
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# A visitor decodes (or descends into) the value starting at an index, yields any
+# elements found inside it, and returns the index just past the value.
+_Visitor = Callable[[str, int], Generator[dict, None, int]]
+
+
+def _skip(raw: str, i: int) -> int:
+    return _WHITESPACE.match(raw, i).end()
+
+
+def _expect(raw: str, i: int, char: str) -> int:
+    i = _skip(raw, i)
+    if raw[i:i + 1] != char:
+        raise ValueError(f"Expected {char!r} at position {i} of parse result")
+    return _skip(raw, i + 1)
+
+
+def _walk_object(raw: str, i: int, visit: _Visitor) -> Generator[dict, None, int]:
+    i = _expect(raw, i, "{")
+    if raw[i:i + 1] == "}":
+        return i + 1
+    while True:
+        key, i = _DECODER.raw_decode(raw, i)
+        i = _expect(raw, i, ":")
+        i = yield from visit(key, i)
+        i = _skip(raw, i)
+        if raw[i:i + 1] == ",":
+            i = _skip(raw, i + 1)
+        elif raw[i:i + 1] == "}":
+            return i + 1
+        else:
+            raise ValueError(f"Expected ',' or '}}' at position {i} of parse result")
+
+
+def _walk_array(raw: str, i: int) -> Generator[dict, None, int]:
+    i = _expect(raw, i, "[")
+    if raw[i:i + 1] == "]":
+        return i + 1
+    while True:
+        item, i = _DECODER.raw_decode(raw, i)
+        yield item
+        i = _skip(raw, i)
+        if raw[i:i + 1] == ",":
+            i = _skip(raw, i + 1)
+        elif raw[i:i + 1] == "]":
+            return i + 1
+        else:
+            raise ValueError(f"Expected ',' or ']' at position {i} of parse result")
+
+
+def _decode_value(raw: str, i: int) -> tuple[Any, int]:
+    return _DECODER.raw_decode(raw, _skip(raw, i))
+
+
+def iter_elements(raw: str, metadata: dict | None = None) -> Iterator[dict]:
+    """Yield ``document.elements`` from ai_parse_document JSON text, one at a time.
+
+    If ``metadata`` is given, the top-level ``metadata`` object is merged into
+    it once the generator reaches it; it is complete when the generator is
+    exhausted.
+    """
+
+    def visit_document(key: str, i: int) -> Generator[dict, None, int]:
+        if key == "elements":
+            return (yield from _walk_array(raw, i))
+        _, i = _decode_value(raw, i)
+        return i
+
+    def visit_top(key: str, i: int) -> Generator[dict, None, int]:
+        if key == "document":
+            return (yield from _walk_object(raw, i, visit_document))
+        value, i = _decode_value(raw, i)
+        if key == "metadata" and metadata is not None and isinstance(value, dict):
+            metadata.update(value)
+        return i
+
+    end = yield from _walk_object(raw, _skip(raw, 0), visit_top)
+    if _skip(raw, end) != len(raw):
+        raise ValueError(f"Unexpected data after parse result at position {end}")
@@ -0,0 +1,95 @@
+"""
+Cheap pre-flight inspection of PDFs before they are parsed.
+
+probe_pdf reads a PDF's page count from its page tree root (``/Pages
+/Count``), reached through the trailer and cross-reference data, without
+walking the page tree or touching any page content. It is used to schedule
+parses shortest-first and to estimate their cost up front.
+first_pages writes a copy limited to the first N pages for page caps.
+
+Both use pypdf when it is installed. Without it, probe_pdf falls back to
+scanning for an uncompressed page tree root and then to an estimate from the
+byte size.
+"""
+
+import logging
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+# Typical arxiv PDF bytes per page, for PDFs whose page count cannot be read
+ESTIMATED_BYTES_PER_PAGE = 60_000
+_SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+_PAGES_COUNT = re.compile(
+    rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b"
+)
+
+logging.getLogger("pypdf").setLevel(logging.ERROR)
+
+
+@dataclass
+class PdfProbe:
+    """Size of a PDF, and its page count if it could be read."""
+    size_bytes: int
+    page_count: int | None
+
+    @property
+    def estimated_pages(self) -> int:
+        """The page count, or a guess from the byte size."""
+        if self.page_count is not None:
+            return self.page_count
+        return max(1, round(self.size_bytes / ESTIMATED_BYTES_PER_PAGE))
+
+
+def _scan_page_count(stream: BinaryIO) -> int | None:
+    """Largest /Count of an uncompressed /Type /Pages node (the root has the largest)."""
+    counts = [int(a or b) for a, b in _PAGES_COUNT.findall(stream.read())]
+    return max(counts) if counts else None
+
+
+def probe_pdf(stream: BinaryIO) -> PdfProbe:
+    """Size and page count of a seekable PDF stream, read from its current position.
+
+    The stream is left positioned where it started.
+    """
+    start = stream.tell()
+    size = stream.seek(0, 2) - start
+    page_count = None
+    try:
+        stream.seek(start)
+        if pypdf is not None:
+            # The reader loads only the trailer and xref. len(reader.pages) would
+            # flatten the whole page tree, so read the root's /Count directly.
+            reader = pypdf.PdfReader(stream)
+            try:
+                page_count = int(reader.trailer["/Root"]["/Pages"]["/Count"])
+            except (KeyError, TypeError, ValueError):
+                page_count = len(reader.pages)
+        else:
+            page_count = _scan_page_count(stream)
+    except Exception:
+        page_count = None
+    finally:
+        stream.seek(start)
+    return PdfProbe(size_bytes=size, page_count=page_count)
+
+
+def first_pages(stream: BinaryIO, max_pages: int) -> BinaryIO:
+    """A copy of the PDF with only its first ``max_pages`` pages, rewound."""
+    if pypdf is None:
+        raise RuntimeError("Page caps require pypdf (pip install pypdf)")
+    reader = pypdf.PdfReader(stream)
+    writer = pypdf.PdfWriter()
+    for page in reader.pages[:max_pages]:
+        writer.add_page(page)
+    output = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES)
+    writer.write(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,417 @@
+"""
+Staged download -> parse -> extract pipeline for selected papers.
+
+Each stage runs its own pool of worker threads and hands papers to the next
+stage through a bounded queue, so paper 2 downloads while paper 1 parses and
+a slow stage applies back-pressure instead of piling up work. With enough
+papers, wall time approaches that of the slowest stage rather than the sum of
+all three.
+
+Downloads probe each PDF's page count (see pdf_probe), and by default papers
+wait for a parse worker shortest first, so short papers are not stuck behind a
+long thesis. estimate_parse turns the page counts into an up-front estimate of
+pages to parse and time to finish. Papers over ``max_pages`` are parsed from
+a copy of their first pages.
+
+PaperPipeline.run is a generator of StageEvent, consumed on the caller's
+thread; the Streamlit app drives its progress bar from it.
+
+Usage:
+    python -m src.pipeline 2210.03629 2303.11366 2305.04091 [--local-first] [--max-pages 40]
+"""
+
+import argparse
+import heapq
+import itertools
+import math
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Iterator, Sequence
+
+from .backends import RoutingParser, RoutingPolicy, WarehouseBackend
+from .ingestion import (
+    ArxivIngestion,
+    DocumentParser,
+    ExtractedPaper,
+    KIEClient,
+    PaperMetadata,
+    ParsedDocument,
+    StagedPdf,
+)
+
+# Downloads are bound by arxiv and volume uploads, parses by the warehouse
+# (which runs many statements at once), extraction by the KIE endpoint.
+DOWNLOAD_WORKERS = 4
+PARSE_WORKERS = 8
+EXTRACT_WORKERS = 4
+# Papers allowed to wait between two stages before the upstream stage blocks
+QUEUE_SIZE = 4
+# Rough ai_parse_document cost on a shared warehouse, for estimates only
+PARSE_OVERHEAD_SECONDS = 20.0
+PARSE_SECONDS_PER_PAGE = 3.0
+
+_DONE = object()
+
+
+class Stage(str, Enum):
+    DOWNLOAD = "download"
+    PARSE = "parse"
+    EXTRACT = "extract"
+
+
+class StageStatus(str, Enum):
+    STARTED = "started"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+@dataclass
+class PaperResult:
+    """Everything the pipeline produced for one paper."""
+    paper: PaperMetadata
+    staged: StagedPdf | None = None
+    parsed: ParsedDocument | None = None
+    extracted: ExtractedPaper | None = None
+    reused_extraction: bool = False
+    parsed_by: str | None = None
+    error: str | None = None
+    stage_seconds: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class StageEvent:
+    """A paper starting, finishing or failing a stage.
+
+    ``result`` is set on the event after which the paper leaves the pipeline
+    (its last stage finished, it failed, or it reused an earlier extraction).
+    ``progress`` is the fraction of all stage steps in the run completed so far.
+    """
+    arxiv_id: str
+    stage: Stage
+    status: StageStatus
+    progress: float
+    elapsed_seconds: float = 0.0
+    error: str | None = None
+    result: PaperResult | None = None
+    # Set when a download finishes, with the probed page count
+    staged: StagedPdf | None = None
+
+
+@dataclass
+class ParseEstimate:
+    """Expected parse work for a set of staged papers."""
+    papers: int
+    pages: int
+    # Until the last parse finishes, and the average time until a paper's does
+    seconds: float
+    mean_seconds: float
+
+
+def parse_seconds(pages: int) -> float:
+    """Rough time for ai_parse_document to parse a document."""
+    return PARSE_OVERHEAD_SECONDS + PARSE_SECONDS_PER_PAGE * pages
+
+
+def estimate_parse(
+    staged: Sequence[StagedPdf],
+    workers: int = PARSE_WORKERS,
+    shortest_first: bool = True,
+) -> ParseEstimate:
+    """Estimate parse time by handing papers to whichever worker frees up first.
+
+    Ignores parse cache hits and the local backend, so it is an upper bound
+    for papers parsed before.
+    """
+    pages = [s.estimated_pages for s in staged]
+    order = sorted(pages) if shortest_first else pages
+    free_at = [0.0] * max(1, workers)
+    finished = []
+    for job in order:
+        start = heapq.heappop(free_at)
+        finished.append(start + parse_seconds(job))
+        heapq.heappush(free_at, finished[-1])
+    return ParseEstimate(
+        papers=len(pages),
+        pages=sum(pages),
+        seconds=max(finished, default=0.0),
+        mean_seconds=sum(finished) / len(finished) if finished else 0.0,
+    )
+
+
+class PaperPipeline:
+    """Download to staging, parse and KIE-extract papers, overlapping the stages."""
+
+    def __init__(
+        self,
+        ingestion: ArxivIngestion | None = None,
+        parser: DocumentParser | RoutingParser | None = None,
+        kie: KIEClient | None = None,
+        download_workers: int = DOWNLOAD_WORKERS,
+        parse_workers: int = PARSE_WORKERS,
+        extract_workers: int = EXTRACT_WORKERS,
+        queue_size: int = QUEUE_SIZE,
+        projection: bool = True,
+        shortest_first: bool = True,
+        max_pages: int | None = None,
+    ):
+        self.ingestion = ingestion or ArxivIngestion()
+        self.parser = parser or DocumentParser(self.ingestion.config, sql=self.ingestion.sql)
+        self.kie = kie or KIEClient(config=self.ingestion.config)
+        self.workers = {
+            Stage.DOWNLOAD: max(1, download_workers),
+            Stage.PARSE: max(1, parse_workers),
+            Stage.EXTRACT: max(1, extract_workers),
+        }
+        self.queue_size = max(1, queue_size)
+        # KIE only needs the text, so by default skip shipping every element back
+        self.projection = projection
+        self.shortest_first = shortest_first
+        self.max_pages = max_pages
+
+    def _download(self, result: PaperResult) -> bool:
+        result.staged = self.ingestion.download_to_staging(result.paper, self.max_pages)
+        # Earlier versions with byte-identical PDFs already have a KIE result
+        extracted = self.ingestion.reusable_extraction(result.staged.parse_sha256)
+        if extracted is not None:
+            result.extracted = extracted
+            result.reused_extraction = True
+            return False
+        return True
+
+    def _parse(self, result: PaperResult) -> bool:
+        # PDFs parsed before (by content hash) come from the parse cache
+        if isinstance(self.parser, RoutingParser):
+            routed = self.parser.route(
+                result.staged.parse_path,
+                result.paper.arxiv_id,
+                content_sha256=result.staged.parse_sha256,
+                projection=self.projection,
+            )
+            result.parsed, result.parsed_by = routed.document, routed.backend
+            return True
+        result.parsed = self.parser.parse_document(
+            result.staged.parse_path,
+            result.paper.arxiv_id,
+            content_sha256=result.staged.parse_sha256,
+            projection=self.projection,
+        )
+        result.parsed_by = "warehouse"
+        return True
+
+    def _extract(self, result: PaperResult) -> bool:
+        result.extracted = self.kie.extract_from_text(
+            result.parsed.text_content, result.paper.arxiv_id
+        )
+        self.ingestion.save_extraction(result.staged.parse_sha256, result.extracted)
+        return True
+
+    def run(self, papers: Sequence[PaperMetadata]) -> Iterator[StageEvent]:
+        """Process papers and yield a StageEvent for every stage transition.
+
+        Closing the generator early stops feeding new papers; stages already
+        running finish in the background and their results are dropped.
+        """
+        papers = list(papers)
+        if not papers:
+            return
+
+        stages: list[tuple[Stage, Callable[[PaperResult], bool]]] = [
+            (Stage.DOWNLOAD, self._download),
+            (Stage.PARSE, self._parse),
+            (Stage.EXTRACT, self._extract),
+        ]
+        total_steps = len(papers) * len(stages)
+        steps_done = 0
+        lock = threading.Lock()
+        events: queue.Queue[StageEvent] = queue.Queue()
+        cancelled = threading.Event()
+        # Items are (priority, seq, result): FIFO unless shortest_first, in which
+        # case papers past download go in order of pages. Parsing is the slow
+        # stage, so it gets every downloaded paper to choose from; staged papers
+        # hold no PDF bytes, so letting downloads run ahead costs nothing.
+        sequence = itertools.count()
+        queues = [
+            queue.PriorityQueue(
+                maxsize=0 if self.shortest_first and stage is Stage.PARSE else self.queue_size
+            )
+            for stage, _ in stages
+        ]
+
+        def put(target: queue.PriorityQueue, result: PaperResult) -> None:
+            priority = next(sequence)
+            if self.shortest_first and result.staged is not None:
+                priority = result.staged.estimated_pages
+            target.put((priority, next(sequence), result))
+
+        def close(target: queue.PriorityQueue) -> None:
+            target.put((math.inf, next(sequence), _DONE))
+
+        def emit(
+            result: PaperResult,
+            stage: Stage,
+            status: StageStatus,
+            steps: int = 0,
+            elapsed: float = 0.0,
+            done: bool = False,
+        ) -> None:
+            nonlocal steps_done
+            with lock:
+                steps_done += steps
+                progress = steps_done / total_steps
+            events.put(StageEvent(
+                arxiv_id=result.paper.arxiv_id,
+                stage=stage,
+                status=status,
+                progress=progress,
+                elapsed_seconds=elapsed,
+                error=result.error,
+                result=result if done else None,
+                staged=result.staged if stage is Stage.DOWNLOAD else None,
+            ))
+
+        def start_stage(index: int) -> None:
+            stage, work = stages[index]
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(stages) else None
+            remaining_stages = len(stages) - index
+            running = [self.workers[stage]]
+
+            def loop() -> None:
+                while (result := inbox.get()[2]) is not _DONE:
+                    if cancelled.is_set():
+                        continue
+                    emit(result, stage, StageStatus.STARTED)
+                    start = time.perf_counter()
+                    try:
+                        forward = work(result)
+                    except Exception as e:
+                        result.error = f"{stage.value.capitalize()} failed: {e}"
+                        forward = False
+                    elapsed = time.perf_counter() - start
+                    result.stage_seconds[stage.value] = elapsed
+                    status = StageStatus.FAILED if result.error else StageStatus.FINISHED
+                    if forward and outbox is not None:
+                        emit(result, stage, status, steps=1, elapsed=elapsed)
+                        put(outbox, result)
+                    else:
+                        # Leaving the pipeline: count the stages it will skip as done
+                        emit(
+                            result, stage, status,
+                            steps=remaining_stages, elapsed=elapsed, done=True,
+                        )
+                # Let sibling workers see the sentinel; the last one out closes the next stage
+                close(inbox)
+                with lock:
+                    running[0] -= 1
+                    last = running[0] == 0
+                if last and outbox is not None:
+                    close(outbox)
+
+            for _ in range(self.workers[stage]):
+                threading.Thread(target=loop, name=f"pipeline-{stage.value}", daemon=True).start()
+
+        def feed() -> None:
+            for paper in papers:
+                if cancelled.is_set():
+                    break
+                put(queues[0], PaperResult(paper=paper))
+            close(queues[0])
+
+        for index in range(len(stages)):
+            start_stage(index)
+        threading.Thread(target=feed, name="pipeline-feed", daemon=True).start()
+
+        finished = 0
+        try:
+            while finished < len(papers):
+                event = events.get()
+                if event.result is not None:
+                    finished += 1
+                yield event
+        finally:
+            cancelled.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download, parse and extract arxiv papers")
+    parser.add_argument("ids", nargs="+", help="arxiv IDs, e.g. 2210.03629")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS)
+    parser.add_argument("--extract-workers", type=int, default=EXTRACT_WORKERS)
+    parser.add_argument(
+        "--local-first", action="store_true",
+        help="Extract text locally with pypdf, using the warehouse only when the policy says so",
+    )
+    parser.add_argument(
+        "--max-pages", type=int, default=None,
+        help="Parse only the first N pages of longer papers",
+    )
+    parser.add_argument(
+        "--fifo", action="store_true", help="Parse in download order instead of shortest first",
+    )
+    args = parser.parse_args()
+
+    ingestion = ArxivIngestion()
+    warehouse = DocumentParser(ingestion.config, sql=ingestion.sql)
+    parser = warehouse
+    if args.local_first:
+        # Same routing as the app: KIE reads only the text, and figure captions
+        # survive local extraction; tables do not
+        parser = RoutingParser(
+            warehouse=WarehouseBackend(warehouse),
+            policy=RoutingPolicy(fallback_on_figures=False),
+            config=ingestion.config,
+            pdf_cache=ingestion.pdf_cache,
+        )
+    pipeline = PaperPipeline(
+        ingestion,
+        parser=parser,
+        download_workers=args.download_workers,
+        parse_workers=args.parse_workers,
+        extract_workers=args.extract_workers,
+        shortest_first=not args.fifo,
+        max_pages=args.max_pages,
+    )
+    papers = pipeline.ingestion.fetch_papers(args.ids)
+    start = time.perf_counter()
+    results = []
+    downloaded = 0
+    to_parse = []
+    for event in pipeline.run(papers):
+        suffix = f" ({event.elapsed_seconds:.1f}s)" if event.status != StageStatus.STARTED else ""
+        print(
+            f"[{event.progress:4.0%}] {event.arxiv_id} "
+            f"{event.stage.value} {event.status.value}{suffix}"
+        )
+        if event.error and event.result is not None:
+            print(f"  ✗ {event.error}")
+        if event.result is not None:
+            results.append(event.result)
+        if event.stage == Stage.DOWNLOAD and event.status != StageStatus.STARTED:
+            downloaded += 1
+            if event.result is None:
+                to_parse.append(event.staged)
+            if downloaded == len(papers) and to_parse:
+                estimate = estimate_parse(to_parse, args.parse_workers, not args.fifo)
+                print(
+                    f"  ~ {estimate.pages} pages in {estimate.papers} papers to parse, "
+                    f"about {estimate.seconds / 60:.0f} min"
+                )
+
+    wall = time.perf_counter() - start
+    serial = sum(sum(r.stage_seconds.values()) for r in results)
+    ok = sum(1 for r in results if r.ok)
+    print(f"\n{ok}/{len(papers)} papers in {wall:.1f}s (stage time summed: {serial:.1f}s)")
+    for backend in sorted({r.parsed_by for r in results if r.parsed_by}):
+        print(f"  parsed by {backend}: {sum(1 for r in results if r.parsed_by == backend)}")
+
+
+if __name__ == "__main__":
+    main()
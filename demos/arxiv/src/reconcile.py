@@ -0,0 +1,289 @@
+"""
+Reconcile the KA volume with the papers table.
+
+A paper should have both a PDF in the volume and a row in the papers table.
+Reconciler streams both sides into a temporary on-disk SQLite database and
+diffs them there, so memory stays flat at any volume size:
+
+- orphan files: a PDF with no row. Repaired by re-saving its metadata from
+  arxiv, or by deleting the file if arxiv does not know the ID or the table
+  already holds the same or a later version of the paper.
+- orphan rows: a row with no PDF. Repaired by deleting the row.
+
+Usage:
+    python -m src.reconcile            # report only
+    python -m src.reconcile --repair
+"""
+
+import argparse
+import itertools
+import shutil
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .config import DEFAULT_CONFIG, DatabricksConfig
+from .ingestion import DELETE_MAX_WORKERS, ArxivIngestion, arxiv_id_from_path, split_arxiv_id
+
+# Rows per SQLite insert batch and per DELETE / arxiv id_list call during repair
+BATCH_SIZE = 1000
+ARXIV_BATCH_SIZE = 100
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+@dataclass
+class ReconcileReport:
+    """Counts from a scan and, if run, a repair."""
+    files_scanned: int = 0
+    rows_scanned: int = 0
+    orphan_files: int = 0
+    orphan_rows: int = 0
+    restored_rows: int = 0
+    deleted_files: int = 0
+    deleted_rows: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def consistent(self) -> bool:
+        return self.orphan_files == 0 and self.orphan_rows == 0
+
+
+class Reconciler:
+    """Find and repair mismatches between the KA volume and the papers table.
+
+    Use as a context manager, or call close(), to remove the scratch database.
+    """
+
+    def __init__(
+        self,
+        config: DatabricksConfig | None = None,
+        ingestion: ArxivIngestion | None = None,
+        batch_size: int = BATCH_SIZE,
+    ):
+        self.config = config or DEFAULT_CONFIG
+        self.ingestion = ingestion or ArxivIngestion(self.config)
+        self.batch_size = batch_size
+        self._workdir = Path(tempfile.mkdtemp(prefix="reconcile_"))
+        self._conn = sqlite3.connect(self._workdir / "diff.sqlite", check_same_thread=False)
+        self._lock = threading.Lock()
+        self.report = ReconcileReport()
+
+    def close(self) -> None:
+        self._conn.close()
+        shutil.rmtree(self._workdir, ignore_errors=True)
+
+    def __enter__(self) -> "Reconciler":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def scan(self) -> ReconcileReport:
+        """List the volume and read the table ID column concurrently, then diff."""
+        with self._lock:
+            self._conn.executescript("""
+                DROP TABLE IF EXISTS files;
+                DROP TABLE IF EXISTS rows;
+                CREATE TABLE files (arxiv_id TEXT PRIMARY KEY, path TEXT);
+                CREATE TABLE rows (arxiv_id TEXT PRIMARY KEY);
+            """)
+
+        files = (
+            (arxiv_id_from_path(path), path)
+            for path in self.ingestion.iter_uploaded_files()
+            if path.endswith(".pdf")
+        )
+        rows = ((row["arxiv_id"],) for row in self.ingestion.iter_papers(columns=("arxiv_id",)))
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            files_scanned = pool.submit(self._load, "files", 2, files)
+            rows_scanned = pool.submit(self._load, "rows", 1, rows)
+            self.report = ReconcileReport(
+                files_scanned=files_scanned.result(), rows_scanned=rows_scanned.result()
+            )
+
+        with self._lock:
+            self.report.orphan_files = self._conn.execute(
+                "SELECT COUNT(*) FROM (SELECT arxiv_id FROM files EXCEPT SELECT arxiv_id FROM rows)"
+            ).fetchone()[0]
+            self.report.orphan_rows = self._conn.execute(
+                "SELECT COUNT(*) FROM (SELECT arxiv_id FROM rows EXCEPT SELECT arxiv_id FROM files)"
+            ).fetchone()[0]
+        return self.report
+
+    def _load(self, table: str, width: int, records: Iterable[tuple]) -> int:
+        sql = f"INSERT OR IGNORE INTO {table} VALUES ({', '.join('?' * width)})"
+        count = 0
+        for batch in _batched(records, self.batch_size):
+            with self._lock, self._conn:
+                self._conn.executemany(sql, batch)
+            count += len(batch)
+        return count
+
+    def _orphans(self, sql: str) -> Iterator[list[tuple]]:
+        """Batches of an orphan query, read from a cursor rather than all at once."""
+        with self._lock:
+            cursor = self._conn.execute(sql)
+        while True:
+            with self._lock:
+                batch = cursor.fetchmany(self.batch_size)
+            if not batch:
+                return
+            yield batch
+
+    def orphan_files(self) -> Iterator[tuple[str, str]]:
+        """(arxiv_id, volume path) for PDFs with no papers row, from the last scan."""
+        for batch in self._orphans(
+            "SELECT arxiv_id, path FROM files WHERE arxiv_id NOT IN (SELECT arxiv_id FROM rows) "
+            "ORDER BY arxiv_id"
+        ):
+            yield from batch
+
+    def orphan_rows(self) -> Iterator[str]:
+        """arxiv_ids of papers rows with no PDF in the volume, from the last scan."""
+        for batch in self._orphans(
+            "SELECT arxiv_id FROM rows WHERE arxiv_id NOT IN (SELECT arxiv_id FROM files) "
+            "ORDER BY arxiv_id"
+        ):
+            yield from (arxiv_id for (arxiv_id,) in batch)
+
+    def repair(self, restore_metadata: bool = True) -> ReconcileReport:
+        """Fix everything found by the last scan, in batches.
+
+        Orphan rows are deleted. Orphan files get their metadata re-saved from
+        arxiv when ``restore_metadata`` is set, arxiv knows the ID, and no row
+        that kept its file (or was restored earlier in this repair) has the same
+        or a later version of the paper; the rest are deleted. A failing batch
+        is recorded in ``errors`` and skipped.
+        """
+        with self._lock:
+            self._conn.executescript("""
+                DROP TABLE IF EXISTS restored;
+                CREATE TABLE restored (arxiv_id TEXT PRIMARY KEY);
+            """)
+
+        for ids in _batched(self.orphan_rows(), self.batch_size):
+            try:
+                self.ingestion.delete_paper_rows(ids)
+                self.report.deleted_rows += len(ids)
+            except Exception as e:
+                self.report.errors.append(f"Deleting {len(ids)} orphan rows failed: {e}")
+
+        batch_size = ARXIV_BATCH_SIZE if restore_metadata else self.batch_size
+        for batch in _batched(self.orphan_files(), batch_size):
+            paths = dict(batch)
+            unrestored = list(paths.values())
+            if restore_metadata:
+                try:
+                    unrestored = self._restore(paths)
+                except Exception as e:
+                    self.report.errors.append(f"Restoring {len(paths)} papers failed: {e}")
+                    continue
+            self._delete_files(unrestored)
+
+        return self.report
+
+    def _restore(self, paths: dict[str, str]) -> list[str]:
+        """Re-save metadata for orphan files. Returns the paths left unrestored.
+
+        Only the highest version of each paper in the batch is restored, and
+        only if it is newer than any version the table keeps; arxiv IDs it has
+        no record of are left unrestored as well.
+        """
+        candidates: dict[str, tuple[int, str]] = {}
+        for arxiv_id in paths:
+            base, version = split_arxiv_id(arxiv_id)
+            version = version or 0
+            kept = self._kept_version(base)
+            if kept is not None and kept >= version:
+                continue
+            if base not in candidates or candidates[base][0] < version:
+                candidates[base] = (version, arxiv_id)
+
+        wanted = {arxiv_id for _, arxiv_id in candidates.values()}
+        papers = []
+        for paper in self.ingestion.fetch_papers(sorted(wanted)):
+            # An unversioned filename gets its row under the same unversioned ID
+            arxiv_id = paper.arxiv_id
+            if arxiv_id not in wanted:
+                arxiv_id = split_arxiv_id(arxiv_id)[0]
+            if arxiv_id in wanted:
+                paper.arxiv_id = arxiv_id
+                paper.volume_path = paths[arxiv_id]
+                papers.append(paper)
+        self.ingestion.upsert_papers(papers)
+        restored = {p.arxiv_id for p in papers}
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO restored VALUES (?)", [(a,) for a in restored]
+            )
+        self.report.restored_rows += len(restored)
+        return [path for arxiv_id, path in paths.items() if arxiv_id not in restored]
+
+    def _kept_version(self, base_id: str) -> int | None:
+        """Highest version of a paper among rows that have their file, or were restored."""
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT arxiv_id FROM rows WHERE (arxiv_id = ? OR arxiv_id GLOB ?) "
+                "AND arxiv_id IN (SELECT arxiv_id FROM files) "
+                "UNION SELECT arxiv_id FROM restored WHERE arxiv_id = ? OR arxiv_id GLOB ?",
+                (base_id, f"{base_id}v[0-9]*") * 2,
+            ).fetchall()
+        versions = [split_arxiv_id(arxiv_id)[1] or 0 for (arxiv_id,) in found]
+        return max(versions) if versions else None
+
+    def _delete_files(self, paths: list[str]) -> None:
+        def delete(path: str) -> str | None:
+            try:
+                self.ingestion.delete_file(path)
+            except Exception as e:
+                return f"Deleting {path} failed: {e}"
+            return None
+
+        if not paths:
+            return
+        with ThreadPoolExecutor(max_workers=min(DELETE_MAX_WORKERS, len(paths))) as pool:
+            for error in pool.map(delete, paths):
+                if error is None:
+                    self.report.deleted_files += 1
+                else:
+                    self.report.errors.append(error)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile the KA volume with the papers table")
+    parser.add_argument(
+        "--repair", action="store_true", help="Fix mismatches, not just report them"
+    )
+    parser.add_argument(
+        "--no-restore", action="store_true",
+        help="Delete orphan files instead of re-saving their metadata from arxiv",
+    )
+    args = parser.parse_args()
+
+    with Reconciler() as reconciler:
+        report = reconciler.scan()
+        print(f"Files: {report.files_scanned}, rows: {report.rows_scanned}")
+        print(f"Orphan files (no row): {report.orphan_files}")
+        print(f"Orphan rows (no file): {report.orphan_rows}")
+        if args.repair and not report.consistent:
+            report = reconciler.repair(restore_metadata=not args.no_restore)
+            print(
+                f"Restored {report.restored_rows} rows, deleted {report.deleted_rows} rows "
+                f"and {report.deleted_files} files"
+            )
+        for error in report.errors:
+            print(f"  ✗ {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Shared SQL statement execution for the arxiv demo.
+
+SqlGateway submits statements to a SQL warehouse without blocking and returns
+futures. A single background thread polls every in-flight statement, backing
+off per statement (with jitter) while it stays queued or running, so many
+independent statements can overlap without a thread each. Statements can be
+given deadlines, enforced by the poller, and futures record how long the
+statement spent queued versus running.
+
+Done-callbacks on statement futures run on the poller thread, so they must not
+block or take locks that blocking code may hold; that would stall every
+statement in the process. Use run_when_done for follow-up work instead.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Sequence, TypeVar
+
+import requests
+from databricks.sdk import WorkspaceClient
+from databricks.sdk.service.sql import (
+    Disposition,
+    ExecuteStatementRequestOnWaitTimeout,
+    ExternalLink,
+    Format,
+    StatementParameterListItem,
+    StatementResponse,
+    StatementState,
+)
+
+from .config import DEFAULT_CONFIG, DatabricksConfig
+
+if TYPE_CHECKING:
+    import pyarrow
+
+_ACTIVE_STATES = (StatementState.PENDING, StatementState.RUNNING)
+
+T = TypeVar("T")
+
+
+class StatementError(RuntimeError):
+    """A statement finished in a state other than SUCCEEDED."""
+
+
+class StatementTimeoutError(StatementError):
+    """A statement missed its deadline and was canceled."""
+
+
+class StatementFuture(Future):
+    """Future for a submitted statement; resolves to its StatementResponse.
+
+    Timing is observed by polling, so it is accurate to the poll interval.
+    """
+
+    def __init__(self, statement_id: str | None = None):
+        super().__init__()
+        self.statement_id = statement_id
+        self.submitted_at = time.monotonic()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    @property
+    def queue_seconds(self) -> float:
+        """Time from submission until the warehouse started running the statement."""
+        end = self.started_at or self.finished_at or time.monotonic()
+        return end - self.submitted_at
+
+    @property
+    def run_seconds(self) -> float:
+        """Time spent running, so far or in total."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+
+@dataclass
+class _InFlight:
+    future: StatementFuture
+    delay: float
+    next_poll: float = field(default_factory=time.monotonic)
+    # Absolute monotonic deadline, and the longest the statement may spend running
+    deadline: float | None = None
+    run_timeout: float | None = None
+
+    def expired(self, now: float) -> str | None:
+        if self.deadline is not None and now >= self.deadline:
+            return "deadline"
+        started = self.future.started_at
+        if self.run_timeout is None or started is None:
+            return None
+        if now - started >= self.run_timeout:
+            return "run timeout"
+        return None
+
+
+def to_parameters(values: dict[str, Any] | None) -> list[StatementParameterListItem] | None:
+    """Convert a name -> value dict into named statement parameters.
+
+    None becomes SQL NULL. bool/int/float are typed so comparisons against
+    numeric and boolean columns do not need casts in the statement.
+    """
+    if not values:
+        return None
+    parameters = []
+    for name, value in values.items():
+        if value is None:
+            parameters.append(StatementParameterListItem(name=name))
+        elif isinstance(value, bool):
+            parameters.append(
+                StatementParameterListItem(name=name, value=str(value).lower(), type="BOOLEAN")
+            )
+        elif isinstance(value, int):
+            parameters.append(
+                StatementParameterListItem(name=name, value=str(value), type="BIGINT")
+            )
+        elif isinstance(value, float):
+            parameters.append(
+                StatementParameterListItem(name=name, value=repr(value), type="DOUBLE")
+            )
+        else:
+            parameters.append(StatementParameterListItem(name=name, value=str(value)))
+    return parameters
+
+
+def run_when_done(futures: Sequence[Future], work: Callable[[], T]) -> "Future[T]":
+    """Run ``work`` on a new thread once all ``futures`` are done; return a future for it.
+
+    For follow-up work on statement futures (local writes, file cleanup) that
+    must not run in a done-callback on the poller thread. ``work`` inspects the
+    futures itself, so it also runs when some of them failed.
+    """
+    result: Future = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def run() -> None:
+        try:
+            result.set_result(work())
+        except Exception as e:
+            result.set_exception(e)
+
+    def on_done(_: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            threading.Thread(target=run, name="sql-gateway-followup", daemon=True).start()
+
+    if not futures:
+        run()
+    for future in futures:
+        future.add_done_callback(on_done)
+    return result
+
+
+class SqlGateway:
+    """Asynchronous statement execution against one SQL warehouse."""
+
+    _shared: dict[tuple, "SqlGateway"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        config: DatabricksConfig | None = None,
+        min_poll_seconds: float = 0.25,
+        max_poll_seconds: float = 5.0,
+        backoff: float = 1.5,
+        jitter: float = 0.2,
+    ):
+        self.config = config or DEFAULT_CONFIG
+        self.min_poll_seconds = min_poll_seconds
+        self.max_poll_seconds = max_poll_seconds
+        self.backoff = backoff
+        self.jitter = jitter
+        self._client: WorkspaceClient | None = None
+        self._in_flight: dict[str, _InFlight] = {}
+        self._cond = threading.Condition()
+        self._poller: threading.Thread | None = None
+        # Plain session for presigned result links, which must not carry workspace auth
+        self._http = requests.Session()
+
+    @classmethod
+    def for_config(cls, config: DatabricksConfig | None = None) -> "SqlGateway":
+        """Process-wide gateway shared by everything using the same warehouse and profile."""
+        config = config or DEFAULT_CONFIG
+        key = (config.warehouse_id, config.profile)
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(config)
+            return cls._shared[key]
+
+    @property
+    def client(self) -> WorkspaceClient:
+        if self._client is None:
+            self._client = WorkspaceClient(profile=self.config.profile)
+        return self._client
+
+    def submit(
+        self,
+        statement: str,
+        parameters: dict[str, Any] | None = None,
+        wait_timeout: str = "0s",
+        timeout: float | None = None,
+        run_timeout: float | None = None,
+        **options: Any,
+    ) -> StatementFuture:
+        """Submit a statement and return a future for its response.
+
+        ``wait_timeout`` lets short statements finish inline ("0s" or "5s"-"50s").
+        ``timeout`` bounds the total time from submission and ``run_timeout`` only
+        the time spent running, so a statement waiting in the warehouse queue is
+        not charged for it. A statement that misses either is canceled and its
+        future fails with StatementTimeoutError.
+        Extra ``options`` (e.g. disposition, format) are passed to execute_statement.
+        """
+        future = StatementFuture()
+        try:
+            response = self.client.statement_execution.execute_statement(
+                warehouse_id=self.config.warehouse_id,
+                statement=statement,
+                parameters=to_parameters(parameters),
+                wait_timeout=wait_timeout,
+                on_wait_timeout=ExecuteStatementRequestOnWaitTimeout.CONTINUE,
+                **options,
+            )
+        except Exception as e:
+            future.set_exception(e)
+            return future
+
+        future.statement_id = response.statement_id
+        if response.status.state in _ACTIVE_STATES:
+            if response.status.state == StatementState.RUNNING:
+                future.started_at = time.monotonic()
+            deadline = future.submitted_at + timeout if timeout is not None else None
+            self._track(future, deadline, run_timeout)
+        else:
+            self._resolve(future, response)
+        return future
+
+    def execute(
+        self,
+        statement: str,
+        parameters: dict[str, Any] | None = None,
+        timeout: float | None = None,
+        **options: Any,
+    ) -> StatementResponse:
+        """Run a statement and block for its response."""
+        return self.submit(statement, parameters, wait_timeout="30s", **options).result(timeout)
+
+    def iter_arrow(
+        self,
+        statement: str,
+        parameters: dict[str, Any] | None = None,
+        max_workers: int = 4,
+        timeout: float | None = None,
+    ) -> Iterator["pyarrow.RecordBatch"]:
+        """Run a query and stream its result as Arrow record batches, in order.
+
+        Uses EXTERNAL_LINKS disposition so results are not capped at the inline
+        limit. Chunks are downloaded in parallel, at most ``max_workers`` ahead of
+        the consumer, so memory stays bounded regardless of result size.
+        If the statement has not finished within ``timeout`` seconds it is
+        canceled and TimeoutError is raised.
+        """
+        import pyarrow as pa
+
+        future = self.submit(
+            statement,
+            parameters,
+            wait_timeout="30s",
+            disposition=Disposition.EXTERNAL_LINKS,
+            format=Format.ARROW_STREAM,
+        )
+        try:
+            response = future.result(timeout)
+        except TimeoutError:
+            self.cancel(future)
+            raise
+        total_chunks = response.manifest.total_chunk_count or 0
+        first_links = (response.result.external_links or []) if response.result else []
+
+        def fetch(chunk_index: int) -> list[pa.RecordBatch]:
+            if chunk_index == 0 and first_links:
+                links = first_links
+            else:
+                chunk = self.client.statement_execution.get_statement_result_chunk_n(
+                    response.statement_id, chunk_index
+                )
+                links = chunk.external_links or []
+            return [batch for link in links for batch in self._read_link(link)]
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            pending = deque()
+            next_chunk = 0
+            while next_chunk < total_chunks or pending:
+                while next_chunk < total_chunks and len(pending) < max_workers:
+                    pending.append(pool.submit(fetch, next_chunk))
+                    next_chunk += 1
+                yield from pending.popleft().result()
+
+    def _read_link(self, link: ExternalLink) -> list["pyarrow.RecordBatch"]:
+        import pyarrow as pa
+
+        response = self._http.get(link.external_link, headers=link.http_headers, timeout=60)
+        response.raise_for_status()
+        with pa.ipc.open_stream(response.content) as reader:
+            return list(reader)
+
+    def cancel(self, future: StatementFuture, error: StatementError | None = None) -> None:
+        """Cancel a statement on the warehouse and fail its future."""
+        with self._cond:
+            self._in_flight.pop(future.statement_id, None)
+        if future.statement_id:
+            self.client.statement_execution.cancel_execution(future.statement_id)
+        if not future.done():
+            future.finished_at = time.monotonic()
+            future.set_exception(
+                error or StatementError(f"Statement {future.statement_id} was canceled")
+            )
+
+    def _next_delay(self, delay: float) -> float:
+        """Back off exponentially, with jitter so statements submitted together spread out."""
+        delay = min(delay * self.backoff, self.max_poll_seconds)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _track(
+        self,
+        future: StatementFuture,
+        deadline: float | None = None,
+        run_timeout: float | None = None,
+    ) -> None:
+        with self._cond:
+            self._in_flight[future.statement_id] = _InFlight(
+                future=future,
+                delay=self.min_poll_seconds,
+                next_poll=time.monotonic() + self.min_poll_seconds,
+                deadline=deadline,
+                run_timeout=run_timeout,
+            )
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(
+                    target=self._poll_loop, name="sql-gateway-poller", daemon=True
+                )
+                self._poller.start()
+            self._cond.notify()
+
+    def _poll_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._in_flight:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [item for item in self._in_flight.values() if item.next_poll <= now]
+                if not due:
+                    next_poll = min(item.next_poll for item in self._in_flight.values())
+                    self._cond.wait(timeout=next_poll - now)
+                    continue
+
+            for item in due:
+                self._poll(item)
+
+    def _poll(self, item: _InFlight) -> None:
+        statement_id = item.future.statement_id
+        try:
+            response = self.client.statement_execution.get_statement(statement_id)
+        except Exception as e:
+            with self._cond:
+                self._in_flight.pop(statement_id, None)
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+
+        if response.status.state in _ACTIVE_STATES:
+            now = time.monotonic()
+            if response.status.state == StatementState.RUNNING and item.future.started_at is None:
+                item.future.started_at = now
+            reason = item.expired(now)
+            if reason:
+                try:
+                    self.cancel(item.future, StatementTimeoutError(
+                        f"Statement {statement_id} canceled after {reason} "
+                        f"(queued {item.future.queue_seconds:.0f}s, "
+                        f"ran {item.future.run_seconds:.0f}s)"
+                    ))
+                except Exception as e:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                return
+            item.delay = self._next_delay(item.delay)
+            item.next_poll = now + item.delay
+            # Wake up in time to enforce the deadlines rather than a full interval late
+            if item.deadline is not None:
+                item.next_poll = min(item.next_poll, item.deadline)
+            if item.run_timeout is not None and item.future.started_at is not None:
+                item.next_poll = min(item.next_poll, item.future.started_at + item.run_timeout)
+            return
+
+        with self._cond:
+            self._in_flight.pop(statement_id, None)
+        self._resolve(item.future, response)
+
+    @staticmethod
+    def _resolve(future: StatementFuture, response: StatementResponse) -> None:
+        if future.done():
+            return
+        future.finished_at = time.monotonic()
+        state = response.status.state
+        if state == StatementState.SUCCEEDED:
+            future.set_result(response)
+        elif state == StatementState.FAILED:
+            future.set_exception(StatementError(f"Statement failed: {response.status.error}"))
+        else:
+            future.set_exception(StatementError(f"Statement ended in state {state}"))
@@ -0,0 +1,110 @@
+"""
+Version-aware paper identity index.
+
+Arxiv IDs carry a version (``2411.15138v2``) but a new version often ships the
+same PDF with only metadata changes. VersionIndex maps each base ID to the
+versions seen and the sha256 of their PDF bytes, and keeps the KIE extraction
+produced for each content hash, so an unchanged PDF under a new version can
+reuse it instead of being extracted again. Parses are reused the same way
+through the ParseCache, which is keyed by the same hash.
+
+The index lives in a local SQLite file under the configured data directory.
+"""
+
+import dataclasses
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from .mirror import utc_now_iso
+
+
+@dataclass
+class VersionRecord:
+    """One version of a paper and the hash of its PDF (version 0 if unversioned)."""
+    arxiv_id: str
+    base_id: str
+    version: int
+    sha256: str
+    size_bytes: int
+
+
+class VersionIndex:
+    """Base ID -> versions and content hashes, plus extractions reusable per hash."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS versions (
+                    arxiv_id TEXT PRIMARY KEY,
+                    base_id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    recorded_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS versions_base ON versions (base_id, version);
+                CREATE TABLE IF NOT EXISTS extractions (
+                    sha256 TEXT PRIMARY KEY,
+                    extracted TEXT NOT NULL
+                );
+            """)
+            self._conn = conn
+        return self._conn
+
+    def record(self, record: VersionRecord) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    record.arxiv_id, record.base_id, record.version,
+                    record.sha256, record.size_bytes, utc_now_iso(),
+                ),
+            )
+
+    def versions(self, base_id: str) -> list[VersionRecord]:
+        """Known versions of a paper, oldest first."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT arxiv_id, base_id, version, sha256, size_bytes FROM versions "
+                "WHERE base_id = ? ORDER BY version",
+                (base_id,),
+            ).fetchall()
+        return [VersionRecord(**dict(row)) for row in rows]
+
+    def get(self, arxiv_id: str) -> VersionRecord | None:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT arxiv_id, base_id, version, sha256, size_bytes FROM versions "
+                "WHERE arxiv_id = ?",
+                (arxiv_id,),
+            ).fetchone()
+        return VersionRecord(**dict(row)) if row else None
+
+    def save_extraction(self, sha256: str, extracted: Any) -> None:
+        """Store a KIE extraction (a dataclass instance) for a content hash."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO extractions (sha256, extracted) VALUES (?, ?)",
+                (sha256, json.dumps(dataclasses.asdict(extracted))),
+            )
+
+    def load_extraction(self, sha256: str) -> dict | None:
+        """Fields of the extraction stored for a content hash, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT extracted FROM extractions WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+        return json.loads(row["extracted"]) if row else None